@@ -1,13 +1,21 @@
 import discord
 from discord.ext import commands, tasks
 import asyncio
+import hashlib
+import heapq
 import os
 import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Optional
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 import json
+import numpy as np
 
 from services.fivem_api import FiveMAPI
+from services.http_client import close_session
 from services.database import DatabaseManager
 from services.analytics import AnalyticsManager
 from services.leaderboard import LeaderboardManager
@@ -29,10 +37,45 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+UTC = timezone.utc
+
+# Hash of the last synced slash command set
+COMMANDS_HASH_FILE = '.commands_hash'
+
+@dataclass(slots=True)
+class ServerStatus:
+    """Snapshot of the server fields the bot reads on every tick"""
+    online: bool = False
+    hostname: str = ''
+    clients: int = 0
+    max_clients: int = 0
+    ping: float = 0
+    
+    @classmethod
+    def from_server_data(cls, data: dict) -> 'ServerStatus':
+        """Build a snapshot from FiveM comprehensive server data"""
+        return cls(
+            online=data.get('online', False),
+            hostname=data.get('hostname', ''),
+            clients=data.get('clients', 0),
+            max_clients=data.get('maxClients', 128),
+            ping=data.get('ping', 0)
+        )
+    
+    def to_dict(self) -> dict:
+        """Convert to the dict shape used by notifications"""
+        return {
+            'online': self.online,
+            'hostname': self.hostname,
+            'clients': self.clients,
+            'maxClients': self.max_clients,
+            'ping': self.ping
+        }
+
 class MotionlifeBot(commands.Bot):
     def __init__(self):
+        # Slash commands only, so message content isn't needed
         intents = discord.Intents.default()
-        intents.message_content = True
         intents.guilds = True
         
         super().__init__(
@@ -51,16 +94,16 @@ class MotionlifeBot(commands.Bot):
         self.notification_manager = None
         
         # Bot state
-        self.server_status = {
-            'online': False,
-            'hostname': '',
-            'clients': 0,
-            'maxClients': 0,
-            'ping': 0
-        }
+        self.server_status = ServerStatus()
         self.players_data = []
         self.presence_rotation_index = 0
         self.last_server_online = False
+        self._state_lock = asyncio.Lock()
+        self._leaderboard_channel = None
+        self._presence_cache = None  # (monotonic timestamp, stats messages)
+        self._last_presence = None
+        self._status_queue = asyncio.Queue(maxsize=4)
+        self._status_consumer = None
         
     async def setup_hook(self):
         """Initialize bot services and tasks"""
@@ -78,6 +121,7 @@ class MotionlifeBot(commands.Bot):
             logger.info(f"FiveM API connection test: {connection_test}")
             
             # Start background tasks
+            self._status_consumer = asyncio.create_task(self._process_server_status())
             self.update_server_status.start()
             self.update_leaderboard.start()
             self.cleanup_task.start()
@@ -92,78 +136,150 @@ class MotionlifeBot(commands.Bot):
         logger.info(f'{self.user} has connected to Discord!')
         logger.info(f'Bot is in {len(self.guilds)} guilds')
         
+        # A new gateway session starts without a presence, resend it on the next update
+        self._last_presence = None
+        
         # Load slash commands
         try:
-            synced = await self.tree.sync()
-            logger.info(f"Synced {len(synced)} slash commands")
+            await self._sync_commands()
         except Exception as e:
             logger.error(f"Failed to sync commands: {e}")
         
+        # Resolve channels once so periodic tasks reuse the cached objects
+        await self._get_leaderboard_channel()
+        
         # Start presence updates only after bot is ready
         if not self.update_presence.is_running():
             self.update_presence.start()
             logger.info("Started presence update task")
     
+    async def on_resumed(self):
+        """Gateway session resumed"""
+        # Don't rely on the presence surviving the reconnect
+        self._last_presence = None
+    
+    async def close(self):
+        """Stop background tasks before closing the Discord connection"""
+        self.update_server_status.cancel()
+        self.update_presence.cancel()
+        self.update_leaderboard.cancel()
+        self.cleanup_task.cancel()
+        
+        if self._status_consumer:
+            self._status_consumer.cancel()
+        
+        await super().close()
+    
+    async def _sync_commands(self):
+        """Sync slash commands, skipping the API call if they haven't changed"""
+        command_specs = sorted(
+            (command.name, command.description) for command in self.tree.get_commands()
+        )
+        commands_hash = hashlib.sha256(
+            json.dumps([self.config.GUILD_ID, command_specs]).encode()
+        ).hexdigest()
+        
+        try:
+            with open(COMMANDS_HASH_FILE) as f:
+                if f.read().strip() == commands_hash:
+                    logger.info("Slash commands unchanged, skipping sync")
+                    return
+        except OSError:
+            pass
+        
+        if self.config.GUILD_ID:
+            # Guild commands propagate immediately, unlike global ones
+            guild = discord.Object(id=self.config.GUILD_ID)
+            self.tree.copy_global_to(guild=guild)
+            synced = await self.tree.sync(guild=guild)
+            
+            # Remove the global copies registered by earlier deployments so users
+            # don't see every command twice. Overwrite the remote global set directly
+            # so the local tree, which the hash is built from, keeps its commands
+            await self.http.bulk_upsert_global_commands(self.application_id, [])
+        else:
+            synced = await self.tree.sync()
+        logger.info(f"Synced {len(synced)} slash commands")
+        
+        with open(COMMANDS_HASH_FILE, 'w') as f:
+            f.write(commands_hash)
+    
     @tasks.loop(seconds=30)  # Update every 30 seconds
     async def update_server_status(self):
-        """Update server status from FiveM API"""
+        """Poll FiveM API and queue the server data for processing"""
         try:
             # Get comprehensive server data
             server_data = await self.fivem_api.get_comprehensive_server_data()
-            
+        except Exception as e:
+            logger.error(f"Error fetching server status: {e}")
+            server_data = None
+        
+        # Drop the oldest snapshot instead of stalling the poller on slow writes
+        if self._status_queue.full():
+            self._status_queue.get_nowait()
+            self._status_queue.task_done()
+            logger.warning("Server status queue full, dropped oldest snapshot")
+        
+        self._status_queue.put_nowait(server_data)
+    
+    async def _process_server_status(self):
+        """Consume queued server data and apply it to bot state"""
+        while True:
+            server_data = await self._status_queue.get()
+            try:
+                await self._apply_server_data(server_data)
+            finally:
+                self._status_queue.task_done()
+    
+    async def _apply_server_data(self, server_data):
+        """Update server status, analytics and notifications from server data"""
+        try:
             if server_data and server_data.get('online', False):
-                self.server_status.update(server_data)
+                self.server_status = ServerStatus.from_server_data(server_data)
                 
                 # Get players data  
                 players_data = server_data.get('players', [])
                 if players_data:
                     self.players_data = players_data
                     
-                    # Update analytics with current players
+                    # Upsert players first so join notifications see their records,
+                    # then log ping stats and check for join/leave notifications
                     await self.analytics_manager.update_player_data(players_data)
-                    
-                    # Log ping data
-                    await self.analytics_manager.log_ping_data(
-                        self.server_status.get('ping', 0)
+                    await asyncio.gather(
+                        self.analytics_manager.log_ping_data(self.server_status.ping),
+                        self.notification_manager.check_player_changes(players_data)
                     )
-                    
-                    # Check for player join/leave notifications
-                    await self.notification_manager.check_player_changes(players_data)
                 
-                # Check if server just came online
-                if not self.last_server_online:
-                    await self.notification_manager.send_server_status_notification(
-                        "online", self.server_status
-                    )
-                    logger.info("Server came online")
-                
-                self.last_server_online = True
+                await self._transition_state(True, self.server_status.to_dict())
                 
             else:
                 # Server is offline
-                self.server_status.update({
-                    'online': False,
-                    'hostname': 'Motionlife Roleplay',
-                    'clients': 0,
-                    'maxClients': 0,
-                    'ping': 0
-                })
+                self.server_status = ServerStatus(hostname='Motionlife Roleplay')
                 self.players_data = []
                 
-                # Check if server just went offline
-                if self.last_server_online:
-                    await self.notification_manager.send_server_status_notification("offline")
-                    logger.warning("Server went offline")
-                
-                self.last_server_online = False
+                await self._transition_state(False)
                 
         except Exception as e:
             logger.error(f"Error updating server status: {e}")
             # Set server as offline on error
-            self.server_status['online'] = False
-            if self.last_server_online:
+            self.server_status.online = False
+            await self._transition_state(False)
+    
+    async def _transition_state(self, online: bool, details: Optional[dict] = None):
+        """Record the server online state and notify once per transition"""
+        async with self._state_lock:
+            # Compare-and-set before any await so a transition is reported only once
+            if online == self.last_server_online:
+                return
+            self.last_server_online = online
+            self._presence_cache = None
+            
+            if online:
+                await self.notification_manager.send_server_status_notification("online", details)
+                logger.info("Server came online")
+            else:
                 await self.notification_manager.send_server_status_notification("offline")
-                self.last_server_online = False
+                logger.warning("Server went offline")
     
     @tasks.loop(seconds=10)
     async def update_presence(self):
@@ -172,27 +288,24 @@ class MotionlifeBot(commands.Bot):
             # Wait for bot to be ready
             if not self.is_ready():
                 return
-                
-            if not self.server_status['online']:
-                await self.change_presence(
-                    status=discord.Status.dnd,
-                    activity=discord.Activity(
-                        type=discord.ActivityType.watching,
-                        name="🔴 Server Offline"
-                    )
+            
+            status = self.server_status
+            if not status.online:
+                await self._set_presence(
+                    discord.Status.dnd,
+                    discord.ActivityType.watching,
+                    "🔴 Server Offline"
                 )
                 return
             
-            clients = self.server_status.get('clients', 0)
-            max_clients = self.server_status.get('maxClients', 128)
+            clients = status.clients
+            max_clients = status.max_clients
             
             if clients < 5:  # Low player count
-                await self.change_presence(
-                    status=discord.Status.idle,
-                    activity=discord.Activity(
-                        type=discord.ActivityType.watching,
-                        name=f"⚙️ {clients}/{max_clients} Players"
-                    )
+                await self._set_presence(
+                    discord.Status.idle,
+                    discord.ActivityType.watching,
+                    f"⚙️ {clients}/{max_clients} Players"
                 )
                 return
             
@@ -201,12 +314,10 @@ class MotionlifeBot(commands.Bot):
             if presence_messages:
                 message = presence_messages[self.presence_rotation_index % len(presence_messages)]
                 
-                await self.change_presence(
-                    status=discord.Status.online,
-                    activity=discord.Activity(
-                        type=discord.ActivityType.playing,
-                        name=message
-                    )
+                await self._set_presence(
+                    discord.Status.online,
+                    discord.ActivityType.playing,
+                    message
                 )
                 
                 self.presence_rotation_index += 1
@@ -214,12 +325,24 @@ class MotionlifeBot(commands.Bot):
         except Exception as e:
             logger.error(f"Error updating presence: {e}")
     
+    async def _set_presence(self, status: discord.Status, activity_type: discord.ActivityType, name: str):
+        """Change presence, skipping the gateway call if nothing changed"""
+        presence = (status, activity_type, name)
+        if presence == self._last_presence:
+            return
+        
+        await self.change_presence(
+            status=status,
+            activity=discord.Activity(type=activity_type, name=name)
+        )
+        self._last_presence = presence
+    
     @tasks.loop(minutes=5)
     async def update_leaderboard(self):
         """Update leaderboard in designated channel"""
         try:
             if self.config.LEADERBOARD_CHANNEL_ID:
-                channel = self.get_channel(self.config.LEADERBOARD_CHANNEL_ID)
+                channel = await self._get_leaderboard_channel()
                 if channel:
                     await self.leaderboard_manager.update_leaderboard_message(channel)
                     logger.debug("Updated leaderboard")
@@ -234,7 +357,7 @@ class MotionlifeBot(commands.Bot):
             await self.analytics_manager.clean_offline_players()
             
             # Clean old database records (daily at midnight)
-            current_hour = datetime.now().hour
+            current_hour = datetime.now(UTC).hour
             if current_hour == 0:  # Midnight UTC
                 await self.db_manager.cleanup_old_data()
                 logger.info("Performed daily database cleanup")
@@ -242,48 +365,120 @@ class MotionlifeBot(commands.Bot):
         except Exception as e:
             logger.error(f"Error in cleanup task: {e}")
     
+    # Stagger loop start times so periodic ticks don't line up
+    @update_server_status.before_loop
+    async def _before_update_server_status(self):
+        await self._stagger_start(10)
+    
+    @update_presence.before_loop
+    async def _before_update_presence(self):
+        await self._stagger_start(10)
+    
+    @update_leaderboard.before_loop
+    async def _before_update_leaderboard(self):
+        await self._stagger_start(30)
+    
+    @cleanup_task.before_loop
+    async def _before_cleanup_task(self):
+        await self._stagger_start(60)
+    
+    async def _stagger_start(self, max_delay: float):
+        """Wait until the bot is ready, then sleep a random offset"""
+        await self.wait_until_ready()
+        await asyncio.sleep(random.uniform(0, max_delay))
+    
+    async def _get_leaderboard_channel(self):
+        """Get leaderboard channel, resolving and caching it on first use"""
+        if self._leaderboard_channel is None and self.config.LEADERBOARD_CHANNEL_ID:
+            channel = self.get_channel(self.config.LEADERBOARD_CHANNEL_ID)
+            if channel is None:
+                try:
+                    channel = await self.fetch_channel(self.config.LEADERBOARD_CHANNEL_ID)
+                except discord.HTTPException as e:
+                    logger.warning(f"Could not fetch leaderboard channel: {e}")
+            self._leaderboard_channel = channel
+        return self._leaderboard_channel
+    
     async def _get_presence_messages(self):
         """Generate rotating presence messages"""
         try:
             messages = []
             
             # Basic server info
-            hostname = self.server_status.get('hostname', 'Motionlife Roleplay')
-            clients = self.server_status.get('clients', 0)
-            max_clients = self.server_status.get('maxClients', 0)
+            status = self.server_status
+            hostname = status.hostname or 'Motionlife Roleplay'
+            clients = status.clients
+            max_clients = status.max_clients
             
             messages.append(f"{clients}/{max_clients} Players On {hostname}")
             
-            # Ping statistics
-            if hasattr(self.analytics_manager, 'get_ping_stats'):
-                ping_stats = await self.analytics_manager.get_ping_stats(hours=1)
-                if ping_stats:
-                    messages.append(
-                        f"Ping: {ping_stats['low']}ms - {ping_stats['high']}ms"
-                    )
-            
-            # Top players
-            if hasattr(self.leaderboard_manager, 'get_top_players'):
-                top_players = await self.leaderboard_manager.get_top_players(limit=3)
-                if top_players:
-                    top_names = [player.get('name', 'Unknown')[:15] for player in top_players]
-                    messages.append(f"Top Players: {', '.join(top_names)}")
+            # Database-backed stats change slowly, reuse them for a minute
+            now = time.monotonic()
+            if self._presence_cache and now - self._presence_cache[0] < 60:
+                stats_messages = self._presence_cache[1]
+            else:
+                stats_messages = await self._get_stats_presence_messages()
+                self._presence_cache = (now, stats_messages)
             
-            # Current session stats
-            if hasattr(self.analytics_manager, 'get_session_statistics'):
-                session_stats = await self.analytics_manager.get_session_statistics()
-                if session_stats.get('total_online', 0) > 0:
-                    avg_session = session_stats.get('average_session_time', 0)
-                    if avg_session > 60:  # More than 1 minute
-                        messages.append(f"Avg Session: {format_playtime(avg_session)}")
+            messages.extend(stats_messages)
             
             return messages if messages else ["Motionlife Roleplay"]
             
         except Exception as e:
             logger.error(f"Error generating presence messages: {e}")
             return ["Motionlife Roleplay"]
+    
+    async def _get_stats_presence_messages(self):
+        """Generate presence messages backed by analytics data"""
+        messages = []
+        
+        # Fetch independent stats concurrently
+        ping_stats, top_players, session_stats = await asyncio.gather(
+            self.analytics_manager.get_ping_stats(hours=1),
+            self.leaderboard_manager.get_top_players(limit=3),
+            self.analytics_manager.get_session_statistics(),
+            return_exceptions=True
+        )
+        
+        # Ping statistics
+        if isinstance(ping_stats, Exception):
+            logger.warning(f"Failed to get ping stats for presence: {ping_stats}")
+        elif ping_stats:
+            messages.append(
+                f"Ping: {ping_stats['low']}ms - {ping_stats['high']}ms"
+            )
+        
+        # Top players
+        if isinstance(top_players, Exception):
+            logger.warning(f"Failed to get top players for presence: {top_players}")
+        elif top_players:
+            top_names = [player.get('name', 'Unknown')[:15] for player in top_players]
+            messages.append(f"Top Players: {', '.join(top_names)}")
+        
+        # Current session stats
+        if isinstance(session_stats, Exception):
+            logger.warning(f"Failed to get session stats for presence: {session_stats}")
+        elif session_stats.get('total_online', 0) > 0:
+            avg_session = session_stats.get('average_session_time', 0)
+            if avg_session > 60:  # More than 1 minute
+                messages.append(f"Avg Session: {format_playtime(avg_session)}")
+        
+        return messages
 
 # Slash Commands
+
+# Static embed parts shared by the commands, copy() before adding fields
+PLAYER_INFO_EMBED = discord.Embed(color=discord.Color.blue()).set_footer(text="Motionlife Roleplay")
+SERVER_PING_EMBED = discord.Embed(
+    title="📊 Server Ping Statistics (24h)",
+    color=discord.Color.green()
+).set_footer(text="Motionlife Roleplay")
+SERVER_STATS_EMBED = discord.Embed(
+    title="📈 Server Statistics (Last 7 Days)",
+    color=discord.Color.purple()
+)
+ONLINE_PLAYERS_EMBED = discord.Embed(color=discord.Color.green()).set_footer(text="Motionlife Roleplay")
+
 @discord.app_commands.describe(name="Player name to lookup")
 async def player_info(interaction: discord.Interaction, name: str):
     """Get detailed player information"""
@@ -313,11 +508,9 @@ async def player_info(interaction: discord.Interaction, name: str):
             )
             return
         
-        embed = discord.Embed(
-            title=f"👤 Player Info: {player_name}",
-            color=discord.Color.blue(),
-            timestamp=datetime.now(timezone.utc)
-        )
+        embed = PLAYER_INFO_EMBED.copy()
+        embed.title = f"👤 Player Info: {player_name}"
+        embed.timestamp = datetime.now(UTC)
         
         # Basic info
         embed.add_field(
@@ -390,8 +583,6 @@ async def player_info(interaction: discord.Interaction, name: str):
                     inline=False
                 )
         
-        embed.set_footer(text="Motionlife Roleplay")
-        
         await interaction.response.send_message(embed=embed)
         
     except Exception as e:
@@ -415,11 +606,8 @@ async def server_ping(interaction: discord.Interaction):
             )
             return
         
-        embed = discord.Embed(
-            title="📊 Server Ping Statistics (24h)",
-            color=discord.Color.green(),
-            timestamp=datetime.now(timezone.utc)
-        )
+        embed = SERVER_PING_EMBED.copy()
+        embed.timestamp = datetime.now(UTC)
         
         embed.add_field(
             name="🟢 Low Ping",
@@ -440,21 +628,19 @@ async def server_ping(interaction: discord.Interaction):
         )
         
         # Add current server status
-        if bot.server_status['online']:
+        if bot.server_status.online:
             embed.add_field(
                 name="🌐 Current Server Ping",
-                value=f"{bot.server_status.get('ping', 0):.1f}ms",
+                value=f"{bot.server_status.ping:.1f}ms",
                 inline=True
             )
             
             embed.add_field(
                 name="👥 Players Online",
-                value=f"{bot.server_status.get('clients', 0)}/{bot.server_status.get('maxClients', 128)}",
+                value=f"{bot.server_status.clients}/{bot.server_status.max_clients}",
                 inline=True
             )
         
-        embed.set_footer(text="Motionlife Roleplay")
-        
         await interaction.response.send_message(embed=embed)
         
     except Exception as e:
@@ -481,11 +667,8 @@ async def server_stats(interaction: discord.Interaction):
             return
         
         # Create embed
-        embed = discord.Embed(
-            title="📈 Server Statistics (Last 7 Days)",
-            color=discord.Color.purple(),
-            timestamp=datetime.now(timezone.utc)
-        )
+        embed = SERVER_STATS_EMBED.copy()
+        embed.timestamp = datetime.now(UTC)
         
         embed.add_field(
             name="👥 Peak Players",
@@ -531,17 +714,11 @@ async def server_stats(interaction: discord.Interaction):
         
         # Generate graph
         try:
-            graph_path = await bot.analytics_manager.generate_stats_graph()
-            if graph_path and os.path.exists(graph_path):
-                file = discord.File(graph_path, filename="server_stats.png")
+            graph = await bot.analytics_manager.generate_stats_graph()
+            if graph:
+                file = discord.File(graph, filename="server_stats.png")
                 embed.set_image(url="attachment://server_stats.png")
                 await interaction.followup.send(embed=embed, file=file)
-                
-                # Clean up
-                try:
-                    os.remove(graph_path)
-                except:
-                    pass
             else:
                 await interaction.followup.send(embed=embed)
         except Exception as graph_error:
@@ -558,14 +735,14 @@ async def online_players(interaction: discord.Interaction):
     try:
         bot = interaction.client
         
-        if not bot.server_status['online']:
+        if not bot.server_status.online:
             await interaction.response.send_message(
                 "❌ Server is currently offline.",
                 ephemeral=True
             )
             return
         
-        online_players = await bot.analytics_manager.get_current_online_players()
+        online_players = bot.analytics_manager.get_current_online_players()
         
         if not online_players:
             await interaction.response.send_message(
@@ -574,17 +751,15 @@ async def online_players(interaction: discord.Interaction):
             )
             return
         
-        embed = discord.Embed(
-            title=f"👥 Online Players ({len(online_players)}/{bot.server_status.get('maxClients', 128)})",
-            color=discord.Color.green(),
-            timestamp=datetime.now()
-        )
+        embed = ONLINE_PLAYERS_EMBED.copy()
+        embed.title = f"👥 Online Players ({len(online_players)}/{bot.server_status.max_clients})"
+        embed.timestamp = datetime.now(UTC)
         
-        # Sort by session duration (longest first)
-        online_players.sort(key=lambda x: x.get('session_duration', 0), reverse=True)
+        # Longest sessions first, limited to 20 players
+        top_players = heapq.nlargest(20, online_players, key=lambda x: x.get('session_duration', 0))
         
         player_list = []
-        for i, player in enumerate(online_players[:20]):  # Limit to 20 players
+        for i, player in enumerate(top_players):
             name = player.get('name', 'Unknown')
             ping = player.get('ping', 0)
             session_time = format_playtime(player.get('session_duration', 0))
@@ -605,10 +780,18 @@ async def online_players(interaction: discord.Interaction):
                 )
         
         # Add summary stats
-        total_session_time = sum(p.get('session_duration', 0) for p in online_players)
-        avg_session_time = total_session_time / len(online_players) if online_players else 0
-        avg_ping = sum(p.get('ping', 0) for p in online_players if p.get('ping', 0) > 0)
-        avg_ping = avg_ping / len([p for p in online_players if p.get('ping', 0) > 0]) if online_players else 0
+        player_count = len(online_players)
+        session_times = np.fromiter(
+            (p.get('session_duration', 0) for p in online_players), dtype=np.int64, count=player_count
+        )
+        pings = np.fromiter(
+            (p.get('ping', 0) for p in online_players), dtype=np.int32, count=player_count
+        )
+        valid_pings = pings[pings > 0]
+        
+        total_session_time = int(session_times.sum())
+        avg_session_time = total_session_time / player_count
+        avg_ping = float(valid_pings.mean()) if valid_pings.size else 0
         
         embed.add_field(
             name="📊 Statistics",
@@ -618,8 +801,6 @@ async def online_players(interaction: discord.Interaction):
             inline=False
         )
         
-        embed.set_footer(text="Motionlife Roleplay")
-        
         await interaction.response.send_message(embed=embed)
         
     except Exception as e:
@@ -671,11 +852,19 @@ async def main():
         logger.error(f"Error starting bot: {e}")
     finally:
         # Cleanup
+        await bot.close()
         if bot.db_manager:
             await bot.db_manager.close()
         if bot.fivem_api:
             await bot.fivem_api.close()
+        await close_session()
         logger.info("Bot shutdown completed")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # Prefer uvloop's faster event loop where it's available
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
\ No newline at end of file
@@ -1,30 +1,96 @@
+import asyncio
+import io
 import logging
+import time
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+from matplotlib.figure import Figure
 import numpy as np
-import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional, Tuple
 from services.database import DatabaseManager
 from utils.helpers import format_playtime, calculate_percentage
+from utils.async_cache import async_ttl_cache, invalidate_cache
 
 logger = logging.getLogger(__name__)
 
 class AnalyticsManager:
     
+    # Server status is polled every 30 seconds
+    UPDATES_PER_DAY = 24 * 60 * 60 // 30
+    
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
         self.current_players = {}  
-        self.session_start_times = {} 
+        self.session_start_times = {}  # player name -> session start (epoch seconds)
+        
+        # Hot per-player fields live in parallel arrays indexed by slot,
+        # cold fields (identifiers, job, role) stay in current_players
+        self._slots: Dict[str, int] = {}
+        self._slot_names: List[Optional[str]] = []
+        self._free_slots: List[int] = []
+        self._ping = np.zeros(0, dtype=np.int32)
+        self._last_update = np.zeros(0, dtype=np.float64)  # epoch seconds
+        self._active = np.zeros(0, dtype=bool)
+        
+        # Hash of the identifiers/job/role last written for each player
+        self._meta_hash: Dict[str, int] = {}
+        
+        # Stats graph figure is built once and redrawn on each request
+        self._fig: Optional[Figure] = None
+        self._fig_lock = asyncio.Lock()
         
         plt.switch_backend('Agg')
         plt.style.use('dark_background')
     
+    def _track_player(self, player_name: str, ping: int, timestamp: float):
+        """Store hot fields for a player, allocating a slot if needed"""
+        slot = self._slots.get(player_name)
+        if slot is None:
+            if self._free_slots:
+                slot = self._free_slots.pop()
+                self._slot_names[slot] = player_name
+            else:
+                slot = len(self._slot_names)
+                self._slot_names.append(player_name)
+                if slot >= len(self._active):
+                    # Grow geometrically so insertion stays amortized O(1)
+                    capacity = max(64, len(self._active) * 2)
+                    self._ping = np.resize(self._ping, capacity)
+                    self._last_update = np.resize(self._last_update, capacity)
+                    active = np.zeros(capacity, dtype=bool)
+                    active[:len(self._active)] = self._active
+                    self._active = active
+            self._slots[player_name] = slot
+            self._active[slot] = True
+        
+        self._ping[slot] = ping
+        self._last_update[slot] = timestamp
+    
+    def _untrack_player(self, player_name: str):
+        """Remove a player from tracking and free their slot"""
+        self.current_players.pop(player_name, None)
+        self._meta_hash.pop(player_name, None)
+        slot = self._slots.pop(player_name, None)
+        if slot is not None:
+            self._active[slot] = False
+            self._slot_names[slot] = None
+            self._free_slots.append(slot)
+    
+    def _get_player_ping(self, player_name: str) -> int:
+        """Get last known ping for a tracked player"""
+        slot = self._slots.get(player_name)
+        return int(self._ping[slot]) if slot is not None else 0
+    
     async def update_player_data(self, players_data: List[Dict[str, Any]]):
         """Update player analytics data - FIXED VERSION"""
         try:
-            current_time = datetime.now()
+            current_time = time.time()
             current_player_names = set()
+            join_events = []
+            player_updates = []
+            # Metadata hashes for this batch, recorded only once the write succeeds
+            pending_hashes = {}
             
             # Process current players
             for player in players_data:
@@ -44,52 +110,77 @@ class AnalyticsManager:
                     self.session_start_times[player_name] = current_time
                     session_time_increment = 0  # Don't add time for first detection
                     
-                    # Log join event
-                    await self.db.log_event('join', player_name, {
-                        'ping': player_ping,
-                        'identifiers': player.get('identifiers', [])
+                    # Queue join event
+                    join_events.append({
+                        'event_type': 'join',
+                        'player_name': player_name,
+                        'details': {
+                            'ping': player_ping,
+                            'identifiers': player.get('identifiers', [])
+                        }
                     })
                     logger.info(f"Player joined: {player_name}")
                 
                 # Update current players tracking
+                self._track_player(player_name, player_ping, current_time)
                 self.current_players[player_name] = {
-                    'last_update': current_time,
-                    'ping': player_ping,
                     'identifiers': player.get('identifiers', []),
                     'job': player.get('job', 'civilian'),
                     'role': player.get('role', 'civilian')
                 }
                 
-                # Update database with incremental playtime
-                await self.db.upsert_player({
+                # Queue database update with incremental playtime
+                player_update = {
                     'name': player_name,
-                    'identifiers': player.get('identifiers', []),
                     'ping': player_ping,
-                    'session_time': session_time_increment,
-                    'job': player.get('job', 'civilian'),
-                    'role': player.get('role', 'civilian')
-                })
+                    'session_time': session_time_increment
+                }
+                
+                # Only write identifiers/job/role when they changed since the last write
+                identifiers = player.get('identifiers', [])
+                job = player.get('job', 'civilian')
+                role = player.get('role', 'civilian')
+                meta_hash = hash((tuple(identifiers), job, role))
+                if self._meta_hash.get(player_name) != meta_hash:
+                    pending_hashes[player_name] = meta_hash
+                    player_update.update(identifiers=identifiers, job=job, role=role)
+                
+                player_updates.append(player_update)
+            
+            # Flush player updates and joins in one round-trip each, upserting
+            # first so new players exist when their session count is incremented
+            if await self.db.bulk_upsert_players(player_updates):
+                self._meta_hash.update(pending_hashes)
+            else:
+                # Resend identifiers/job/role on the next update
+                for player_name in pending_hashes:
+                    self._meta_hash.pop(player_name, None)
+            await self.db.log_events(join_events)
             
             # Handle players who left
+            leave_events = []
+            final_updates = []
             left_players = set(self.current_players.keys()) - current_player_names
             for player_name in left_players:
                 # Calculate total session time
                 if player_name in self.session_start_times:
-                    session_duration = (current_time - self.session_start_times[player_name]).total_seconds()
+                    session_duration = current_time - self.session_start_times[player_name]
                     
-                    # Log leave event
-                    await self.db.log_event('leave', player_name, {
-                        'session_duration': session_duration
+                    # Queue leave event
+                    leave_events.append({
+                        'event_type': 'leave',
+                        'player_name': player_name,
+                        'details': {'session_duration': session_duration}
                     })
                     
                     # Update final session time
                     remaining_time = int(session_duration % 30)  # Any remaining time
                     if remaining_time > 0:
-                        await self.db.upsert_player({
+                        final_updates.append({
                             'name': player_name,
                             'session_time': remaining_time,
                             'identifiers': self.current_players[player_name].get('identifiers', []),
-                            'ping': self.current_players[player_name].get('ping', 0),
+                            'ping': self._get_player_ping(player_name),
                             'job': self.current_players[player_name].get('job', 'civilian'),
                             'role': self.current_players[player_name].get('role', 'civilian')
                         })
@@ -100,7 +191,13 @@ class AnalyticsManager:
                     del self.session_start_times[player_name]
                 
                 # Remove from current players
-                del self.current_players[player_name]
+                self._untrack_player(player_name)
+            
+            await self.db.log_events(leave_events)
+            await self.db.bulk_upsert_players(final_updates)
+            
+            # New data was written, drop cached stats
+            invalidate_cache(self)
         
         except Exception as e:
             logger.error(f"Error updating player data: {e}")
@@ -108,12 +205,9 @@ class AnalyticsManager:
     async def log_ping_data(self, server_ping: float):
         """Log server ping data with player statistics"""
         try:
-            player_pings = [
-                data['ping'] for data in self.current_players.values() 
-                if data['ping'] > 0
-            ]
+            player_pings = self._ping[self._active & (self._ping > 0)]
             
-            if not player_pings:
+            if not player_pings.size:
                 ping_stats = {
                     'low': server_ping,
                     'avg': server_ping,
@@ -121,10 +215,11 @@ class AnalyticsManager:
                     'server_ping': server_ping
                 }
             else:
+                # Cast back to Python numbers so the document stays BSON-encodable
                 ping_stats = {
-                    'low': min(player_pings),
-                    'avg': sum(player_pings) / len(player_pings),
-                    'high': max(player_pings),
+                    'low': int(player_pings.min()),
+                    'avg': float(player_pings.mean()),
+                    'high': int(player_pings.max()),
                     'server_ping': server_ping
                 }
             
@@ -140,41 +235,15 @@ class AnalyticsManager:
             if not player:
                 return None
             
-            # Get recent events for this player
-            recent_events = await self.db.get_recent_events(limit=50)
-            player_events = [
-                event for event in recent_events 
-                if event.get('player_name') == player_name
-            ]
-            
-            # Calculate additional stats
-            join_events = [
-                event for event in player_events 
-                if event.get('event_type') == 'join'
-            ]
-            
-            leave_events = [
-                event for event in player_events 
-                if event.get('event_type') == 'leave'
-            ]
-            
-            total_sessions = len(join_events)
-            
-            # Calculate average session time from recent leave events
-            recent_sessions = [
-                event.get('details', {}).get('session_duration', 0)
-                for event in leave_events[-10:]  # Last 10 sessions
-                if event.get('details', {}).get('session_duration', 0) > 0
-            ]
-            
-            avg_session = sum(recent_sessions) / len(recent_sessions) if recent_sessions else 0
+            # Get this player's events and session stats from the database
+            event_summary = await self.db.get_player_event_summary(player_name, recent_limit=5)
             
             return {
                 **player,
-                'total_sessions': total_sessions,
-                'recent_events': player_events[:5],  # Last 5 events
+                'total_sessions': event_summary['total_sessions'],
+                'recent_events': event_summary['recent_events'],  # Last 5 events
                 'avg_ping': player.get('ping', 0),
-                'avg_session_duration': int(avg_session),
+                'avg_session_duration': int(event_summary['avg_session_duration']),
                 'is_online': player_name in self.current_players,
                 'current_session_duration': self._get_current_session_duration(player_name)
             }
@@ -186,14 +255,15 @@ class AnalyticsManager:
     def _get_current_session_duration(self, player_name: str) -> int:
         """Get current session duration for online player"""
         if player_name in self.session_start_times:
-            duration = (datetime.now() - self.session_start_times[player_name]).total_seconds()
-            return int(duration)
+            return int(time.time() - self.session_start_times[player_name])
         return 0
     
+    @async_ttl_cache(ttl=60)
     async def get_ping_stats(self, hours: int = 24) -> Optional[Dict[str, float]]:
         """Get ping statistics"""
         return await self.db.get_ping_stats(hours)
     
+    @async_ttl_cache(ttl=60)
     async def get_server_stats(self, days: int = 7) -> Dict[str, Any]:
         """Get comprehensive server statistics"""
         try:
@@ -231,7 +301,7 @@ class AnalyticsManager:
             logger.error(f"Error getting server stats: {e}")
             return {}
     
-    async def generate_stats_graph(self, days: int = 7) -> Optional[str]:
+    async def generate_stats_graph(self, days: int = 7) -> Optional[io.BytesIO]:
         """Generate server statistics graph"""
         try:
             # Get historical data
@@ -242,98 +312,95 @@ class AnalyticsManager:
                 logger.warning("No data available for graph generation")
                 return None
             
-            # Create figure with subplots
-            fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
-            fig.patch.set_facecolor('#2f3136')
-            
-            # Plot 1: Player count over time
-            if stats_history:
-                dates = [stat['date'] for stat in stats_history]
-                player_counts = [stat.get('peak_players', 0) for stat in stats_history]
-                
-                ax1.plot(dates, player_counts, color='#7289da', linewidth=2, marker='o')
-                ax1.set_title('Peak Players (Last 7 Days)', color='white', fontsize=14)
-                ax1.set_ylabel('Players', color='white')
-                ax1.grid(True, alpha=0.3)
-                ax1.tick_params(colors='white')
-                
-                # Format x-axis
-                ax1.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
-                ax1.xaxis.set_major_locator(mdates.DayLocator())
-            
-            # Plot 2: Ping over time
-            if ping_data:
-                timestamps = [entry['timestamp'] for entry in ping_data]
-                avg_pings = [entry['avg'] for entry in ping_data]
-                low_pings = [entry['low'] for entry in ping_data]
-                high_pings = [entry['high'] for entry in ping_data]
-                
-                ax2.plot(timestamps, avg_pings, color='#43b581', linewidth=2, label='Average')
-                ax2.fill_between(timestamps, low_pings, high_pings, alpha=0.3, color='#43b581')
-                ax2.set_title('Server Ping (Last 7 Days)', color='white', fontsize=14)
-                ax2.set_ylabel('Ping (ms)', color='white')
-                ax2.grid(True, alpha=0.3)
-                ax2.tick_params(colors='white')
-                ax2.legend()
-                
-                # Format x-axis
-                ax2.xaxis.set_major_formatter(mdates.DateFormatter('%d/%m'))
-                ax2.xaxis.set_major_locator(mdates.DayLocator())
-            
-            # Style the plot
-            for ax in [ax1, ax2]:
-                ax.set_facecolor('#36393f')
-                ax.spines['bottom'].set_color('white')
-                ax.spines['top'].set_color('white')
-                ax.spines['right'].set_color('white')
-                ax.spines['left'].set_color('white')
-            
-            plt.tight_layout()
-            
-            # Save graph
-            filename = f"server_stats_{datetime.now().strftime('%d%m%Y_%H%M%S')}.png"
-            filepath = os.path.join('/tmp', filename)
-            plt.savefig(filepath, facecolor='#2f3136', dpi=150, bbox_inches='tight')
-            plt.close()
-            
-            return filepath
+            # Rendering is CPU-bound, keep it off the event loop
+            async with self._fig_lock:
+                return await asyncio.to_thread(self._render_stats_graph, stats_history, ping_data)
             
         except Exception as e:
             logger.error(f"Error generating stats graph: {e}")
             return None
     
+    def _render_stats_graph(self, stats_history: List[Dict[str, Any]], ping_data: List[Dict[str, Any]]) -> io.BytesIO:
+        """Render statistics graph to an in-memory PNG (blocking, run in a worker thread)"""
+        # Use the object-oriented API so renders don't touch global pyplot state
+        if self._fig is None:
+            self._fig = Figure(figsize=(12, 10))
+            self._fig.subplots(2, 1)
+            self._fig.patch.set_facecolor('#2f3136')
+            # Fixed margins instead of running the layout engine on every render
+            self._fig.subplots_adjust(left=0.08, right=0.98, top=0.94, bottom=0.08, hspace=0.3)
+        
+        fig = self._fig
+        ax1, ax2 = fig.axes
+        ax1.clear()
+        ax2.clear()
+        
+        # Plot 1: Player count over time
+        if stats_history:
+            dates = np.array([stat['date'] for stat in stats_history], dtype='datetime64[s]')
+            player_counts = np.fromiter(
+                (stat.get('peak_players', 0) for stat in stats_history),
+                dtype=np.int32, count=len(stats_history)
+            )
+            
+            ax1.plot(dates, player_counts, color='#7289da', linewidth=2, marker='o')
+            ax1.set_title('Peak Players (Last 7 Days)', color='white', fontsize=14)
+            ax1.set_ylabel('Players', color='white')
+            ax1.grid(True, alpha=0.3)
+            ax1.tick_params(colors='white')
+            
+            # Format x-axis
+            ax1.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
+            ax1.xaxis.set_major_locator(mdates.DayLocator())
+        
+        # Plot 2: Ping over time
+        if ping_data:
+            count = len(ping_data)
+            timestamps = np.array([entry['timestamp'] for entry in ping_data], dtype='datetime64[s]')
+            avg_pings = np.fromiter((entry['avg'] for entry in ping_data), dtype=np.float64, count=count)
+            low_pings = np.fromiter((entry['low'] for entry in ping_data), dtype=np.float64, count=count)
+            high_pings = np.fromiter((entry['high'] for entry in ping_data), dtype=np.float64, count=count)
+            
+            ax2.plot(timestamps, avg_pings, color='#43b581', linewidth=2, label='Average')
+            ax2.fill_between(timestamps, low_pings, high_pings, alpha=0.3, color='#43b581')
+            ax2.set_title('Server Ping (Last 7 Days)', color='white', fontsize=14)
+            ax2.set_ylabel('Ping (ms)', color='white')
+            ax2.grid(True, alpha=0.3)
+            ax2.tick_params(colors='white')
+            ax2.legend()
+            
+            # Format x-axis
+            ax2.xaxis.set_major_formatter(mdates.DateFormatter('%d/%m'))
+            ax2.xaxis.set_major_locator(mdates.DayLocator())
+        
+        # Style the plot
+        for ax in [ax1, ax2]:
+            ax.set_facecolor('#36393f')
+            ax.spines['bottom'].set_color('white')
+            ax.spines['top'].set_color('white')
+            ax.spines['right'].set_color('white')
+            ax.spines['left'].set_color('white')
+        
+        # Save graph
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', facecolor='#2f3136', dpi=120)
+        buffer.seek(0)
+        
+        return buffer
+    
+    @async_ttl_cache(ttl=60)
     async def _calculate_peak_players(self, days: int) -> int:
         """Calculate peak players for specified period"""
         try:
-            # Get historical peak from events
             cutoff = datetime.now() - timedelta(days=days)
             
-            # Count concurrent players by analyzing join/leave events
-            events = await self.db.get_recent_events(limit=1000)
-            events = [e for e in events if e.get('timestamp', datetime.min) >= cutoff]
+            # Concurrent players are computed server-side from join/leave events
+            peak_players = await self.db.get_peak_concurrent_players(cutoff)
             
-            if not events:
+            if peak_players is None:
                 return len(self.current_players)
             
-            # Sort events by timestamp
-            events.sort(key=lambda x: x.get('timestamp', datetime.min))
-            
-            # Track concurrent players over time
-            concurrent_players = set()
-            max_concurrent = 0
-            
-            for event in events:
-                player_name = event.get('player_name')
-                event_type = event.get('event_type')
-                
-                if event_type == 'join':
-                    concurrent_players.add(player_name)
-                elif event_type == 'leave':
-                    concurrent_players.discard(player_name)
-                
-                max_concurrent = max(max_concurrent, len(concurrent_players))
-            
-            return max_concurrent
+            return peak_players
             
         except Exception as e:
             logger.error(f"Error calculating peak players: {e}")
@@ -353,6 +420,7 @@ class AnalyticsManager:
             logger.error(f"Error calculating average players: {e}")
             return 0.0
     
+    @async_ttl_cache(ttl=60)
     async def _calculate_uptime_percentage(self, days: int) -> float:
         """Calculate server uptime percentage based on successful API calls"""
         try:
@@ -360,7 +428,7 @@ class AnalyticsManager:
             cutoff = datetime.now() - timedelta(days=days)
             
             # Expected number of updates (every 30 seconds)
-            expected_updates = (days * 24 * 60 * 60) / 30
+            expected_updates = days * self.UPDATES_PER_DAY
             
             # Count actual ping logs
             actual_updates = await self.db.db.ping_logs.count_documents({
@@ -377,6 +445,7 @@ class AnalyticsManager:
             logger.error(f"Error calculating uptime: {e}")
             return 95.0  # Default reasonable uptime
     
+    @async_ttl_cache(ttl=60)
     async def _get_historical_ping_data(self, days: int) -> List[Dict[str, Any]]:
         """Get historical ping data for graphing"""
         try:
@@ -399,11 +468,9 @@ class AnalyticsManager:
                 {"$sort": {"_id": 1}}
             ]
             
-            results = await self.db.db.ping_logs.aggregate(pipeline).to_list(None)
-            
-            # Convert to proper format
+            # Stream the hourly buckets instead of materializing the whole result first
             ping_data = []
-            for result in results:
+            async for result in await self.db.db.ping_logs.aggregate(pipeline, batchSize=500):
                 timestamp = datetime(
                     result["_id"]["year"],
                     result["_id"]["month"],
@@ -426,10 +493,10 @@ class AnalyticsManager:
     async def generate_player_trends(self) -> Dict[str, Any]:
         """Generate player trend analysis"""
         try:
-            # Get player data for trend analysis
-            current_week = await self.db.get_active_players_count(hours=24*7)
-            previous_week_data = await self.db.get_active_players_count(hours=24*14)
-            previous_week = max(0, previous_week_data - current_week)
+            # Get both weekly windows and top players in one round-trip
+            trend_data = await self.db.get_player_trend_data(hours=24*7, top_limit=5)
+            current_week = trend_data['current']
+            previous_week = trend_data['previous']
             
             # Calculate trends
             if previous_week > 0:
@@ -438,7 +505,7 @@ class AnalyticsManager:
                 trend_percentage = 100.0 if current_week > 0 else 0.0
             
             # Get top growing players (by playtime increase)
-            top_players = await self.db.get_players_by_playtime(limit=5)
+            top_players = trend_data['top_players']
             
             return {
                 'current_week_active': current_week,
@@ -459,26 +526,10 @@ class AnalyticsManager:
             if category == 'playtime':
                 return await self.db.get_players_by_playtime(limit)
             elif category == 'sessions':
-                # Get players by session count
-                pipeline = [
-                    {"$group": {
-                        "_id": "$player_name",
-                        "sessions": {"$sum": {"$cond": [{"$eq": ["$event_type", "join"]}, 1, 0]}},
-                        "last_seen": {"$max": "$timestamp"}
-                    }},
-                    {"$sort": {"sessions": -1}},
-                    {"$limit": limit}
-                ]
-                
-                results = await self.db.db.event_logs.aggregate(pipeline).to_list(limit)
-                
-                # Get full player data
-                leaderboard = []
-                for result in results:
-                    player_data = await self.db.get_player(result["_id"])
-                    if player_data:
-                        player_data['total_sessions'] = result['sessions']
-                        leaderboard.append(player_data)
+                # Session counts are maintained on the player documents at join time
+                leaderboard = await self.db.get_players_by_sessions(limit)
+                for player_data in leaderboard:
+                    player_data['total_sessions'] = player_data['totalSessions']
                 
                 return leaderboard
             else:
@@ -491,29 +542,36 @@ class AnalyticsManager:
     async def clean_offline_players(self):
         """Clean up offline players from current tracking"""
         try:
-            current_time = datetime.now()
-            offline_threshold = timedelta(minutes=2)  # Players offline for 2+ minutes
+            current_time = time.time()
+            offline_threshold = 120  # Players offline for 2+ minutes
             
-            offline_players = []
-            for player_name, data in list(self.current_players.items()):
-                if current_time - data['last_update'] > offline_threshold:
-                    offline_players.append(player_name)
+            stale_slots = np.flatnonzero(
+                self._active & (current_time - self._last_update > offline_threshold)
+            )
+            offline_players = [self._slot_names[slot] for slot in stale_slots]
             
             # Remove offline players and log leave events if not already logged
+            leave_events = []
             for player_name in offline_players:
                 if player_name in self.session_start_times:
-                    session_duration = (current_time - self.session_start_times[player_name]).total_seconds()
+                    session_duration = current_time - self.session_start_times[player_name]
                     
-                    # Log leave event
-                    await self.db.log_event('leave', player_name, {
-                        'session_duration': session_duration,
-                        'reason': 'timeout'
+                    # Queue leave event
+                    leave_events.append({
+                        'event_type': 'leave',
+                        'player_name': player_name,
+                        'details': {
+                            'session_duration': session_duration,
+                            'reason': 'timeout'
+                        }
                     })
                     
                     logger.info(f"Player timed out: {player_name} (session: {format_playtime(int(session_duration))})")
                     del self.session_start_times[player_name]
                 
-                del self.current_players[player_name]
+                self._untrack_player(player_name)
+            
+            await self.db.log_events(leave_events)
             
             if offline_players:
                 logger.info(f"Cleaned {len(offline_players)} offline players from tracking")
@@ -527,18 +585,20 @@ class AnalyticsManager:
     
     def get_current_online_players(self) -> List[Dict[str, Any]]:
         """Get list of currently online players"""
-        current_time = datetime.now()
-        return [
-            {
+        current_time = time.time()
+        players = []
+        for name, data in self.current_players.items():
+            slot = self._slots[name]
+            online_since = self.session_start_times.get(name, float(self._last_update[slot]))
+            players.append({
                 'name': name,
-                'ping': data['ping'],
-                'online_since': self.session_start_times.get(name, data['last_update']),
-                'session_duration': int((current_time - self.session_start_times.get(name, data['last_update'])).total_seconds()),
+                'ping': int(self._ping[slot]),
+                'online_since': datetime.fromtimestamp(online_since),
+                'session_duration': int(current_time - online_since),
                 'job': data.get('job', 'civilian'),
                 'role': data.get('role', 'civilian')
-            }
-            for name, data in self.current_players.items()
-        ]
+            })
+        return players
     
     async def force_player_update(self, player_name: str):
         """Force update a specific player's data"""
@@ -548,7 +608,7 @@ class AnalyticsManager:
                 
                 # Calculate current session time
                 if player_name in self.session_start_times:
-                    session_time = int((datetime.now() - self.session_start_times[player_name]).total_seconds())
+                    session_time = int(time.time() - self.session_start_times[player_name])
                 else:
                     session_time = 0
                 
@@ -556,7 +616,7 @@ class AnalyticsManager:
                 await self.db.upsert_player({
                     'name': player_name,
                     'identifiers': player_data.get('identifiers', []),
-                    'ping': player_data.get('ping', 0),
+                    'ping': self._get_player_ping(player_name),
                     'session_time': session_time,
                     'job': player_data.get('job', 'civilian'),
                     'role': player_data.get('role', 'civilian')
@@ -574,7 +634,6 @@ class AnalyticsManager:
     async def get_session_statistics(self) -> Dict[str, Any]:
         """Get current session statistics"""
         try:
-            current_time = datetime.now()
             online_players = self.get_current_online_players()
             
             if not online_players:
@@ -585,14 +644,17 @@ class AnalyticsManager:
                     'average_ping': 0
                 }
             
-            session_times = [p['session_duration'] for p in online_players]
-            pings = [p['ping'] for p in online_players if p['ping'] > 0]
+            session_times = np.fromiter(
+                (p['session_duration'] for p in online_players),
+                dtype=np.int64, count=len(online_players)
+            )
+            pings = np.fromiter((p['ping'] for p in online_players if p['ping'] > 0), dtype=np.int32)
             
             return {
                 'total_online': len(online_players),
-                'average_session_time': int(sum(session_times) / len(session_times)),
-                'longest_session': max(session_times),
-                'average_ping': round(sum(pings) / len(pings), 1) if pings else 0,
+                'average_session_time': int(session_times.mean()),
+                'longest_session': int(session_times.max()),
+                'average_ping': round(float(pings.mean()), 1) if pings.size else 0,
                 'players': online_players
             }
             
@@ -1,22 +1,105 @@
-import motor.motor_asyncio
+import asyncio
+import contextlib
+import re
+import bson
 import logging
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List, Any
-from pymongo import IndexModel, ASCENDING, DESCENDING
+from pymongo import AsyncMongoClient, IndexModel, ReadPreference, UpdateOne, ASCENDING, DESCENDING
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import BulkWriteError, OperationFailure
+from utils.async_cache import async_ttl_cache, invalidate_cache
 
 logger = logging.getLogger(__name__)
 
+# Collection indexes, created on connect
+PLAYER_INDEXES = [
+    IndexModel([("name", ASCENDING)], unique=True),
+    IndexModel([("name_lc", ASCENDING)]),
+    IndexModel([("identifiers", ASCENDING)]),
+    IndexModel([("lastSeen", DESCENDING)]),
+    IndexModel([("playtime", DESCENDING)]),
+    IndexModel([("totalSessions", DESCENDING)]),
+    IndexModel([("firstSeen", ASCENDING)])
+]
+
+# The TTL index also serves timestamp range queries and sorts in either direction
+PING_LOG_INDEXES = [
+    IndexModel([("timestamp", ASCENDING)], expireAfterSeconds=2592000)  # 30 days TTL
+]
+
+# Equality field first, then the sort/range field; unfiltered recent events use timestamp alone
+EVENT_LOG_INDEXES = [
+    IndexModel([("timestamp", ASCENDING)], expireAfterSeconds=7776000),  # 90 days TTL
+    IndexModel([("event_type", ASCENDING), ("timestamp", DESCENDING)]),
+    IndexModel([("player_name", ASCENDING), ("timestamp", DESCENDING)])
+]
+
+# Hourly ping rollups are kept as long as the raw ping logs
+PING_STATS_HOURLY_INDEXES = [
+    IndexModel([("hour", ASCENDING)], unique=True, expireAfterSeconds=2592000)  # 30 days TTL
+]
+
+# Indexes earlier versions created that the definitions above replace, dropped on startup
+LEGACY_INDEXES = {
+    'ping_logs': ['timestamp_-1'],  # Served by the timestamp TTL index
+    'event_logs': ['timestamp_-1', 'event_type_1', 'player_name_1']  # Served by the TTL and compound indexes
+}
+
+SERVER_STATS_INDEXES = [
+    IndexModel([("timestamp", DESCENDING)]),
+    IndexModel([("date", ASCENDING)], unique=True)
+]
+
 class DatabaseManager:
     
+    # Fields shown on leaderboards with their defaults filled in server-side,
+    # leaves out large ones like identifiers
+    LEADERBOARD_PROJECTION = {
+        "_id": 0,
+        "name": {"$ifNull": ["$name", "Unknown"]},
+        "playtime": {"$ifNull": ["$playtime", 0]},
+        "totalSessions": {"$ifNull": ["$totalSessions", 0]},
+        "lastSeen": 1,
+        "job": {"$ifNull": ["$job", "civilian"]},
+        "role": {"$ifNull": ["$role", "civilian"]}
+    }
+    
+    # Buffered log writes are flushed when a buffer reaches this size or on each interval
+    LOG_BATCH_SIZE = 100
+    LOG_FLUSH_INTERVAL = 1.0
+    # Failed flushes are requeued, beyond this many entries the oldest are dropped
+    LOG_BUFFER_LIMIT = 5000
+    
     def __init__(self, mongodb_uri: str):
         self.mongodb_uri = mongodb_uri
-        self.client: Optional[motor.motor_asyncio.AsyncIOMotorClient] = None
-        self.db: Optional[motor.motor_asyncio.AsyncIOMotorDatabase] = None
+        self.client: Optional[AsyncMongoClient] = None
+        self.db: Optional[AsyncDatabase] = None
+        
+        self._event_buffer: List[Dict[str, Any]] = []
+        self._ping_buffer: List[Dict[str, Any]] = []
+        self._session_buffer: Dict[str, int] = {}
+        self._rollup_buffer: Dict[datetime, Dict[str, Any]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flusher_task: Optional[asyncio.Task] = None
         
     async def connect(self):
         """Connect to MongoDB"""
         try:
-            self.client = motor.motor_asyncio.AsyncIOMotorClient(self.mongodb_uri)
+            # Native asyncio driver, no thread pool hop per operation
+            self.client = AsyncMongoClient(
+                self.mongodb_uri,
+                maxPoolSize=50,
+                minPoolSize=5,  # Keep warm connections for commands after idle periods
+                maxIdleTimeMS=30000,
+                waitQueueTimeoutMS=10000,
+                compressors="zstd,zlib",  # Servers without zstd fall back to zlib
+                tz_aware=False,  # Stored timestamps are naive, skip tz conversion on decode
+                retryWrites=True
+            )
+            
+            if not bson.has_c():
+                logger.warning("PyMongo C extensions are not available, BSON encoding will be slow")
             
             # Get database name from URI or use default
             db_name = self.mongodb_uri.split('/')[-1] if '/' in self.mongodb_uri else 'motionlife_rp'
@@ -29,51 +112,224 @@ class DatabaseManager:
             # Initialize collections and indexes
             await self._setup_collections()
             
+            self._flusher_task = asyncio.create_task(self._flusher())
+            
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
             raise
     
     async def _setup_collections(self):
         """Setup collections and indexes"""
+        # Collections are independent, create their indexes concurrently. A failed
+        # build is logged per collection and doesn't stop the others or the backfills
+        index_specs = {
+            'players': PLAYER_INDEXES,
+            'ping_logs': PING_LOG_INDEXES,
+            'event_logs': EVENT_LOG_INDEXES,
+            'ping_stats_hourly': PING_STATS_HOURLY_INDEXES,
+            'server_stats': SERVER_STATS_INDEXES
+        }
+        results = await asyncio.gather(
+            *(self.db[name].create_indexes(indexes) for name, indexes in index_specs.items()),
+            return_exceptions=True
+        )
+        for name, result in zip(index_specs, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error creating indexes for {name}: {result}")
+        
+        await self._drop_legacy_indexes()
+        
+        # Build the hourly ping rollup from existing logs on first run
         try:
-            # Players collection indexes
-            await self.db.players.create_indexes([
-                IndexModel([("name", ASCENDING)], unique=True),
-                IndexModel([("identifiers", ASCENDING)]),
-                IndexModel([("lastSeen", DESCENDING)]),
-                IndexModel([("playtime", DESCENDING)]),
-                IndexModel([("firstSeen", ASCENDING)])
-            ])
-            
-            # Ping logs collection indexes
-            await self.db.ping_logs.create_indexes([
-                IndexModel([("timestamp", DESCENDING)]),
-                IndexModel([("timestamp", ASCENDING)], expireAfterSeconds=2592000)  # 30 days TTL
-            ])
-            
-            # Event logs collection indexes
-            await self.db.event_logs.create_indexes([
-                IndexModel([("timestamp", DESCENDING)]),
-                IndexModel([("event_type", ASCENDING)]),
-                IndexModel([("player_name", ASCENDING)]),
-                IndexModel([("player_name", ASCENDING), ("timestamp", DESCENDING)])
-            ])
-            
-            # Server stats collection indexes
-            await self.db.server_stats.create_indexes([
-                IndexModel([("timestamp", DESCENDING)]),
-                IndexModel([("date", ASCENDING)], unique=True)
-            ])
-            
-            logger.info("Database collections and indexes setup completed")
-            
+            if not await self.db.ping_stats_hourly.estimated_document_count():
+                await self._backfill_ping_rollup()
+        except Exception as e:
+            logger.error(f"Error backfilling ping rollups: {e}")
+        
+        # Backfill the lowercased name used by player search
+        try:
+            await self.db.players.update_many(
+                {"name_lc": {"$exists": False}},
+                [{"$set": {"name_lc": {"$toLower": "$name"}}}]
+            )
         except Exception as e:
-            logger.error(f"Error setting up collections: {e}")
+            logger.error(f"Error backfilling player search names: {e}")
+        
+        logger.info("Database collections and indexes setup completed")
+    
+    async def _drop_legacy_indexes(self):
+        """Drop indexes from earlier versions so they don't add to every insert"""
+        for collection_name, index_names in LEGACY_INDEXES.items():
+            for index_name in index_names:
+                try:
+                    await self.db[collection_name].drop_index(index_name)
+                    logger.info(f"Dropped legacy index {collection_name}.{index_name}")
+                except OperationFailure as e:
+                    # IndexNotFound on databases that never had it or already dropped it
+                    if e.code != 27:
+                        logger.warning(f"Could not drop legacy index {collection_name}.{index_name}: {e}")
+    
+    async def _backfill_ping_rollup(self):
+        """Populate ping_stats_hourly from the raw ping logs"""
+        pipeline = [
+            {"$group": {
+                "_id": {"$dateTrunc": {"date": "$timestamp", "unit": "hour"}},
+                "sum_low": {"$sum": "$low"},
+                "sum_avg": {"$sum": "$avg"},
+                "sum_high": {"$sum": "$high"},
+                "n": {"$sum": 1},
+                "min_low": {"$min": "$low"},
+                "max_high": {"$max": "$high"}
+            }},
+            {"$set": {"hour": "$_id"}},
+            {"$unset": "_id"},
+            {"$merge": {"into": "ping_stats_hourly", "on": "hour", "whenMatched": "replace"}}
+        ]
+        cursor = await self.db.ping_logs.aggregate(pipeline)
+        await cursor.to_list(None)
+    
+    async def _write_events(self, event_entries: List[Dict[str, Any]]) -> bool:
+        """Insert event log entries and increment session counts for joins"""
+        join_counts: Dict[str, int] = {}
+        for event in event_entries:
+            if event["event_type"] == "join":
+                join_counts[event["player_name"]] = join_counts.get(event["player_name"], 0) + 1
+        
+        if not join_counts:
+            result = await self.db.event_logs.insert_many(event_entries, ordered=False)
+            return result.acknowledged
+        
+        # Different collections, so issue both writes concurrently rather than in sequence
+        result, _ = await asyncio.gather(
+            self.db.event_logs.insert_many(event_entries, ordered=False),
+            self.db.players.bulk_write([
+                UpdateOne({"name": name}, {"$inc": {"totalSessions": count}})
+                for name, count in join_counts.items()
+            ], ordered=False)
+        )
+        return result.acknowledged
+    
+    async def _flusher(self):
+        """Periodically flush buffered log writes"""
+        while True:
+            await asyncio.sleep(self.LOG_FLUSH_INTERVAL)
+            # Shielded so cancelling the flusher can't drop buffers a flush has already taken
+            await asyncio.shield(self.flush())
+    
+    def _requeue(self, buffer: List[Dict[str, Any]], entries: List[Dict[str, Any]], kind: str):
+        """Put unwritten entries back at the front of a buffer for the next flush"""
+        buffer[:0] = entries
+        overflow = len(buffer) - self.LOG_BUFFER_LIMIT
+        if overflow > 0:
+            del buffer[:overflow]
+            logger.warning(f"Dropped {overflow} oldest buffered {kind} over the buffer limit")
+    
+    @staticmethod
+    def _unwritten(entries: List[Any], error: Exception, skip_duplicates: bool = True) -> List[Any]:
+        """Entries a failed unordered bulk write didn't apply"""
+        if isinstance(error, BulkWriteError):
+            # For inserts, duplicate keys are entries an earlier attempt already wrote
+            return [
+                entries[err["index"]] for err in error.details.get("writeErrors", [])
+                if not (skip_duplicates and err.get("code") == 11000)
+            ]
+        return entries
+    
+    async def flush(self):
+        """Write buffered events and ping logs to the database"""
+        async with self._flush_lock:
+            events, self._event_buffer = self._event_buffer, []
+            sessions, self._session_buffer = self._session_buffer, {}
+            pings, self._ping_buffer = self._ping_buffer, []
+            
+            # Inserted documents keep their _id, so a requeued entry is never inserted twice
+            if events:
+                try:
+                    await self.db.event_logs.insert_many(events, ordered=False)
+                except Exception as e:
+                    logger.error(f"Error flushing {len(events)} events: {e}")
+                    self._requeue(self._event_buffer, self._unwritten(events, e), "events")
+            
+            if sessions:
+                names = list(sessions)
+                try:
+                    await self.db.players.bulk_write([
+                        UpdateOne({"name": name}, {"$inc": {"totalSessions": sessions[name]}})
+                        for name in names
+                    ], ordered=False)
+                except Exception as e:
+                    logger.error(f"Error flushing session counts for {len(names)} players: {e}")
+                    for name in self._unwritten(names, e):
+                        self._session_buffer[name] = self._session_buffer.get(name, 0) + sessions[name]
+            
+            if pings:
+                try:
+                    await self.db.ping_logs.insert_many(pings, ordered=False)
+                except Exception as e:
+                    logger.error(f"Error flushing {len(pings)} ping logs: {e}")
+                    unwritten = self._unwritten(pings, e)
+                    self._requeue(self._ping_buffer, unwritten, "ping logs")
+                    # Only entries that made it into ping_logs are rolled up now
+                    unwritten_ids = {id(ping) for ping in unwritten}
+                    pings = [ping for ping in pings if id(ping) not in unwritten_ids]
+            
+            # Rollups are retried on their own, the raw logs are already in ping_logs
+            rollups, self._rollup_buffer = self._rollup_buffer, {}
+            for ping in pings:
+                hour = ping["timestamp"].replace(minute=0, second=0, microsecond=0)
+                rollup = rollups.get(hour)
+                if rollup is None:
+                    rollups[hour] = {
+                        "sum_low": ping["low"], "sum_avg": ping["avg"], "sum_high": ping["high"],
+                        "n": 1, "min_low": ping["low"], "max_high": ping["high"]
+                    }
+                else:
+                    rollup["sum_low"] += ping["low"]
+                    rollup["sum_avg"] += ping["avg"]
+                    rollup["sum_high"] += ping["high"]
+                    rollup["n"] += 1
+                    rollup["min_low"] = min(rollup["min_low"], ping["low"])
+                    rollup["max_high"] = max(rollup["max_high"], ping["high"])
+            
+            if rollups:
+                hours = list(rollups)
+                try:
+                    await self.db.ping_stats_hourly.bulk_write([
+                        UpdateOne(
+                            {"hour": hour},
+                            {
+                                "$inc": {
+                                    "sum_low": rollups[hour]["sum_low"],
+                                    "sum_avg": rollups[hour]["sum_avg"],
+                                    "sum_high": rollups[hour]["sum_high"],
+                                    "n": rollups[hour]["n"]
+                                },
+                                "$min": {"min_low": rollups[hour]["min_low"]},
+                                "$max": {"max_high": rollups[hour]["max_high"]}
+                            },
+                            upsert=True
+                        )
+                        for hour in hours
+                    ], ordered=False)
+                except Exception as e:
+                    logger.error(f"Error updating {len(hours)} hourly ping rollups: {e}")
+                    # At most one entry per hour, so the retry buffer stays small
+                    for hour in self._unwritten(hours, e, skip_duplicates=False):
+                        self._rollup_buffer[hour] = rollups[hour]
     
     async def close(self):
         """Close database connection"""
+        if self._flusher_task:
+            self._flusher_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flusher_task
+            self._flusher_task = None
+        
+        if self.db is not None:
+            await self.flush()
+        
         if self.client:
-            self.client.close()
+            await self.client.close()
             logger.info("Database connection closed")
     
     # Player Management - FIXED VERSION
@@ -83,13 +339,10 @@ class DatabaseManager:
             filter_query = {"name": player_data["name"]}
             current_time = datetime.now()
             
-            # Check if player exists
-            existing_player = await self.db.players.find_one(filter_query)
-            
             update_data = {
                 "$set": {
                     "name": player_data["name"],
-                    "identifiers": player_data.get("identifiers", []),
+                    "name_lc": player_data["name"].lower(),
                     "lastSeen": current_time,
                     "job": player_data.get("job", "civilian"),
                     "role": player_data.get("role", "civilian"),
@@ -97,16 +350,16 @@ class DatabaseManager:
                 },
                 "$inc": {
                     "playtime": player_data.get("session_time", 0)
-                }
-            }
-            
-            # Set initial data for new players
-            if not existing_player:
-                update_data["$setOnInsert"] = {
+                },
+                # Only applied when the upsert inserts a new player
+                "$setOnInsert": {
                     "firstSeen": current_time,
                     "totalSessions": 0
                 }
-                logger.info(f"Creating new player record: {player_data['name']}")
+            }
+            
+            if player_data.get("identifiers"):
+                update_data["$addToSet"] = {"identifiers": {"$each": player_data["identifiers"]}}
             
             result = await self.db.players.update_one(
                 filter_query, 
@@ -114,6 +367,11 @@ class DatabaseManager:
                 upsert=True
             )
             
+            invalidate_cache(self)
+            
+            if result.upserted_id is not None:
+                logger.info(f"Created new player record: {player_data['name']}")
+            
             if result.acknowledged and player_data.get("session_time", 0) > 0:
                 logger.debug(f"Updated player {player_data['name']} playtime by {player_data.get('session_time', 0)} seconds")
             
@@ -123,46 +381,119 @@ class DatabaseManager:
             logger.error(f"Error upserting player {player_data.get('name', 'Unknown')}: {e}")
             return False
     
+    async def bulk_upsert_players(self, players_data: List[Dict[str, Any]]) -> bool:
+        """Insert or update many players with a single bulk write"""
+        if not players_data:
+            return True
+        
+        try:
+            current_time = datetime.now()
+            operations = []
+            for player_data in players_data:
+                set_fields = {
+                    "name": player_data["name"],
+                    "name_lc": player_data["name"].lower(),
+                    "lastSeen": current_time,
+                    "ping": player_data.get("ping", 0)
+                }
+                
+                # Metadata is only sent when it changed, omitted keys are left as stored
+                for field in ("job", "role"):
+                    if field in player_data:
+                        set_fields[field] = player_data[field]
+                
+                update_data = {
+                    "$set": set_fields,
+                    "$inc": {
+                        "playtime": player_data.get("session_time", 0)
+                    },
+                    "$setOnInsert": {
+                        "firstSeen": current_time,
+                        "totalSessions": 0
+                    }
+                }
+                
+                # Merge identifiers so reconnects with new ones keep the old ones
+                if player_data.get("identifiers"):
+                    update_data["$addToSet"] = {"identifiers": {"$each": player_data["identifiers"]}}
+                
+                operations.append(UpdateOne({"name": player_data["name"]}, update_data, upsert=True))
+            
+            result = await self.db.players.bulk_write(operations, ordered=False)
+            invalidate_cache(self)
+            
+            if result.upserted_count:
+                logger.info(f"Created {result.upserted_count} new player records")
+            
+            return result.acknowledged
+            
+        except Exception as e:
+            logger.error(f"Error bulk upserting {len(players_data)} players: {e}")
+            return False
+    
+    @async_ttl_cache(ttl=5, maxsize=1024)
     async def get_player(self, name: str) -> Optional[Dict[str, Any]]:
         """Get player data by name"""
         try:
             player = await self.db.players.find_one({"name": name})
             if player:
-                # Ensure required fields exist
-                player.setdefault('playtime', 0)
-                player.setdefault('totalSessions', 0)
-                player.setdefault('job', 'civilian')
-                player.setdefault('role', 'civilian')
-                player.setdefault('ping', 0)
+                self._apply_player_defaults(player)
             return player
             
         except Exception as e:
             logger.error(f"Error getting player {name}: {e}")
             return None
     
+    async def get_players_by_names(self, names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get several players by name in one query, keyed by name"""
+        try:
+            cursor = self.db.players.find({"name": {"$in": names}})
+            players = await cursor.to_list(length=len(names))
+            return {player['name']: self._apply_player_defaults(player) for player in players}
+            
+        except Exception as e:
+            logger.error(f"Error getting players {names}: {e}")
+            return {}
+    
+    @staticmethod
+    def _apply_player_defaults(player: Dict[str, Any]) -> Dict[str, Any]:
+        """Ensure required fields exist on a player document"""
+        player.setdefault('playtime', 0)
+        player.setdefault('totalSessions', 0)
+        player.setdefault('job', 'civilian')
+        player.setdefault('role', 'civilian')
+        player.setdefault('ping', 0)
+        return player
+    
     async def get_players_by_playtime(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get top players by playtime"""
         try:
-            cursor = self.db.players.find({
-                "playtime": {"$gt": 0}  # Only players with actual playtime
-            }).sort("playtime", DESCENDING).limit(limit)
+            cursor = self._analytics_col('players').find(
+                {"playtime": {"$gt": 0}},  # Only players with actual playtime
+                self.LEADERBOARD_PROJECTION
+            ).sort("playtime", DESCENDING).limit(limit)
             
-            players = await cursor.to_list(length=limit)
+            return await cursor.to_list(length=limit)
             
-            # Ensure all required fields
-            for player in players:
-                player.setdefault('playtime', 0)
-                player.setdefault('totalSessions', 0)
-                player.setdefault('job', 'civilian')
-                player.setdefault('role', 'civilian')
-                player.setdefault('name', 'Unknown')
+        except Exception as e:
+            logger.error(f"Error getting players by playtime: {e}")
+            return []
+    
+    async def get_players_by_sessions(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get top players by session count"""
+        try:
+            cursor = self._analytics_col('players').find(
+                {"totalSessions": {"$gt": 0}},
+                self.LEADERBOARD_PROJECTION
+            ).sort("totalSessions", DESCENDING).limit(limit)
             
-            return players
+            return await cursor.to_list(length=limit)
             
         except Exception as e:
-            logger.error(f"Error getting players by playtime: {e}")
+            logger.error(f"Error getting players by sessions: {e}")
             return []
     
+    @async_ttl_cache(ttl=30)
     async def get_active_players_count(self, hours: int = 24) -> int:
         """Get count of active players in last N hours"""
         try:
@@ -176,6 +507,49 @@ class DatabaseManager:
             logger.error(f"Error getting active players count: {e}")
             return 0
     
+    async def get_player_trend_data(self, hours: int = 24*7, top_limit: int = 5) -> Dict[str, Any]:
+        """Get active player counts for the current and previous window plus top players in one query"""
+        try:
+            current_cutoff = datetime.now() - timedelta(hours=hours)
+            previous_cutoff = current_cutoff - timedelta(hours=hours)
+            
+            pipeline = [
+                {"$facet": {
+                    "current": [
+                        {"$match": {"lastSeen": {"$gte": current_cutoff}}},
+                        {"$count": "n"}
+                    ],
+                    "previous": [
+                        {"$match": {"lastSeen": {"$gte": previous_cutoff, "$lt": current_cutoff}}},
+                        {"$count": "n"}
+                    ],
+                    "top_players": [
+                        {"$match": {"playtime": {"$gt": 0}}},
+                        {"$sort": {"playtime": DESCENDING}},
+                        {"$limit": top_limit},
+                        {"$project": self.LEADERBOARD_PROJECTION}
+                    ]
+                }}
+            ]
+            
+            cursor = await self.db.players.aggregate(pipeline)
+            result = await cursor.to_list(1)
+            facets = result[0] if result else {}
+            
+            top_players = facets.get("top_players", [])
+            
+            current = facets.get("current")
+            previous = facets.get("previous")
+            return {
+                "current": current[0]["n"] if current else 0,
+                "previous": previous[0]["n"] if previous else 0,
+                "top_players": top_players
+            }
+            
+        except Exception as e:
+            logger.error(f"Error getting player trend data: {e}")
+            return {"current": 0, "previous": 0, "top_players": []}
+    
     async def increment_player_sessions(self, player_name: str) -> bool:
         """Increment player session count"""
         try:
@@ -193,16 +567,17 @@ class DatabaseManager:
     async def log_ping_data(self, ping_data: Dict[str, Any]) -> bool:
         """Log server ping data"""
         try:
-            log_entry = {
+            self._ping_buffer.append({
                 "timestamp": datetime.now(),
                 "low": float(ping_data.get("low", 0)),
                 "avg": float(ping_data.get("avg", 0)),
                 "high": float(ping_data.get("high", 0)),
                 "server_ping": float(ping_data.get("server_ping", 0))
-            }
+            })
             
-            result = await self.db.ping_logs.insert_one(log_entry)
-            return result.acknowledged
+            if len(self._ping_buffer) >= self.LOG_BATCH_SIZE:
+                await self.flush()
+            return True
             
         except Exception as e:
             logger.error(f"Error logging ping data: {e}")
@@ -211,28 +586,32 @@ class DatabaseManager:
     async def get_ping_stats(self, hours: int = 24) -> Optional[Dict[str, float]]:
         """Get ping statistics for last N hours"""
         try:
+            # Aggregate the hourly rollups, the window starts at the top of the cutoff hour
             cutoff = datetime.now() - timedelta(hours=hours)
+            cutoff_hour = cutoff.replace(minute=0, second=0, microsecond=0)
             
             pipeline = [
-                {"$match": {"timestamp": {"$gte": cutoff}}},
+                {"$match": {"hour": {"$gte": cutoff_hour}}},
                 {"$group": {
                     "_id": None,
-                    "avg_low": {"$avg": "$low"},
-                    "avg_ping": {"$avg": "$avg"},
-                    "avg_high": {"$avg": "$high"},
-                    "min_ping": {"$min": "$low"},
-                    "max_ping": {"$max": "$high"},
-                    "count": {"$sum": 1}
+                    "sum_low": {"$sum": "$sum_low"},
+                    "sum_avg": {"$sum": "$sum_avg"},
+                    "sum_high": {"$sum": "$sum_high"},
+                    "min_ping": {"$min": "$min_low"},
+                    "max_ping": {"$max": "$max_high"},
+                    "count": {"$sum": "$n"}
                 }}
             ]
             
-            result = await self.db.ping_logs.aggregate(pipeline).to_list(1)
+            cursor = await self._analytics_col('ping_stats_hourly').aggregate(pipeline)
+            result = await cursor.to_list(1)
             if result and result[0]["count"] > 0:
                 stats = result[0]
+                count = stats["count"]
                 return {
-                    "low": round(stats.get("avg_low", 0), 1),
-                    "avg": round(stats.get("avg_ping", 0), 1),
-                    "high": round(stats.get("avg_high", 0), 1),
+                    "low": round(stats["sum_low"] / count, 1),
+                    "avg": round(stats["sum_avg"] / count, 1),
+                    "high": round(stats["sum_high"] / count, 1),
                     "min": round(stats.get("min_ping", 0), 1),
                     "max": round(stats.get("max_ping", 0), 1)
                 }
@@ -246,33 +625,59 @@ class DatabaseManager:
     async def log_event(self, event_type: str, player_name: str, details: Dict[str, Any] = None) -> bool:
         """Log player events (join/leave) with enhanced data"""
         try:
-            event_entry = {
+            # Buffered, session counts for joins are flushed separately so a
+            # retried event insert never counts the same join twice
+            self._event_buffer.append({
                 "timestamp": datetime.now(),
                 "event_type": event_type,
                 "player_name": player_name,
                 "details": details or {}
-            }
+            })
+            if event_type == "join":
+                self._session_buffer[player_name] = self._session_buffer.get(player_name, 0) + 1
             
-            result = await self.db.event_logs.insert_one(event_entry)
+            if len(self._event_buffer) >= self.LOG_BATCH_SIZE:
+                await self.flush()
+            return True
             
-            # If it's a join event, increment session count
-            if event_type == "join" and result.acknowledged:
-                await self.increment_player_sessions(player_name)
+        except Exception as e:
+            logger.error(f"Error logging event {event_type} for {player_name}: {e}")
+            return False
+    
+    async def log_events(self, events: List[Dict[str, Any]]) -> bool:
+        """Log many player events with a single insert"""
+        if not events:
+            return True
+        
+        try:
+            current_time = datetime.now()
+            event_entries = [
+                {
+                    "timestamp": current_time,
+                    "event_type": event["event_type"],
+                    "player_name": event["player_name"],
+                    "details": event.get("details") or {}
+                }
+                for event in events
+            ]
             
-            return result.acknowledged
+            return await self._write_events(event_entries)
             
         except Exception as e:
-            logger.error(f"Error logging event {event_type} for {player_name}: {e}")
+            logger.error(f"Error logging {len(events)} events: {e}")
             return False
     
-    async def get_recent_events(self, limit: int = 50, event_type: str = None) -> List[Dict[str, Any]]:
+    async def get_recent_events(self, limit: int = 50, event_type: str = None, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
         """Get recent player events with optional filtering"""
         try:
             filter_query = {}
             if event_type:
                 filter_query["event_type"] = event_type
+            if since:
+                # Served by the timestamp or event_type + timestamp index
+                filter_query["timestamp"] = {"$gte": since}
             
-            cursor = self.db.event_logs.find(filter_query).sort("timestamp", DESCENDING).limit(limit)
+            cursor = self.db.event_logs.find(filter_query).sort("timestamp", DESCENDING).limit(limit).batch_size(limit)
             events = await cursor.to_list(length=limit)
             
             return events
@@ -284,29 +689,120 @@ class DatabaseManager:
     async def get_player_events(self, player_name: str, limit: int = 20) -> List[Dict[str, Any]]:
         """Get events for specific player"""
         try:
-            cursor = self.db.event_logs.find({
-                "player_name": player_name
-            }).sort("timestamp", DESCENDING).limit(limit)
+            # Pin the (player_name, timestamp) index so a cold planner can't pick another one
+            cursor = self.db.event_logs.find(
+                {"player_name": player_name},
+                {"_id": 0, "player_name": 1, "event_type": 1, "timestamp": 1, "details": 1}
+            ).hint([("player_name", ASCENDING), ("timestamp", DESCENDING)]).sort(
+                "timestamp", DESCENDING
+            ).limit(limit).batch_size(limit)
             
-            events = await cursor.to_list(length=limit)
-            return events
+            return await cursor.to_list(length=limit)
             
         except Exception as e:
             logger.error(f"Error getting events for player {player_name}: {e}")
             return []
     
+    async def get_player_event_summary(self, player_name: str, recent_limit: int = 5) -> Dict[str, Any]:
+        """Get recent events and session stats for a player in one aggregation"""
+        try:
+            # Uses the (player_name, timestamp) index for the match and sort
+            pipeline = [
+                {"$match": {"player_name": player_name}},
+                {"$sort": {"timestamp": DESCENDING}},
+                {"$facet": {
+                    "recent_events": [{"$limit": recent_limit}],
+                    "sessions": [
+                        {"$match": {"event_type": "join"}},
+                        {"$count": "count"}
+                    ],
+                    "session_duration": [
+                        {"$match": {
+                            "event_type": "leave",
+                            "details.session_duration": {"$gt": 0}
+                        }},
+                        {"$limit": 10},  # Last 10 sessions
+                        {"$group": {"_id": None, "avg": {"$avg": "$details.session_duration"}}}
+                    ]
+                }}
+            ]
+            
+            cursor = await self.db.event_logs.aggregate(pipeline)
+            result = await cursor.to_list(1)
+            facets = result[0] if result else {}
+            sessions = facets.get("sessions", [])
+            session_duration = facets.get("session_duration", [])
+            
+            return {
+                "recent_events": facets.get("recent_events", []),
+                "total_sessions": sessions[0]["count"] if sessions else 0,
+                "avg_session_duration": session_duration[0]["avg"] if session_duration else 0
+            }
+            
+        except Exception as e:
+            logger.error(f"Error getting event summary for player {player_name}: {e}")
+            return {
+                "recent_events": [],
+                "total_sessions": 0,
+                "avg_session_duration": 0
+            }
+    
+    async def get_event_activity_summary(self, since: datetime, top_limit: int = 5) -> Dict[str, Any]:
+        """Count joins, leaves, unique players and the most active players since a time"""
+        try:
+            # Counted server-side so only the totals and the top players come back
+            pipeline = [
+                {"$match": {"timestamp": {"$gte": since}}},
+                {"$facet": {
+                    "event_types": [
+                        {"$group": {"_id": "$event_type", "count": {"$sum": 1}}}
+                    ],
+                    "unique_players": [
+                        {"$group": {"_id": "$player_name"}},
+                        {"$count": "count"}
+                    ],
+                    "most_active": [
+                        {"$match": {"player_name": {"$nin": [None, ""]}}},
+                        {"$group": {"_id": "$player_name", "count": {"$sum": 1}}},
+                        {"$sort": {"count": DESCENDING, "_id": ASCENDING}},
+                        {"$limit": top_limit}
+                    ]
+                }}
+            ]
+            
+            result = await self._aggregate(self._analytics_col('event_logs'), pipeline, 1)
+            facets = result[0] if result else {}
+            event_counts = {row["_id"]: row["count"] for row in facets.get("event_types", [])}
+            unique_players = facets.get("unique_players", [])
+            
+            return {
+                "joins": event_counts.get("join", 0),
+                "leaves": event_counts.get("leave", 0),
+                "unique_players": unique_players[0]["count"] if unique_players else 0,
+                "most_active": [(row["_id"], row["count"]) for row in facets.get("most_active", [])]
+            }
+            
+        except Exception as e:
+            logger.error(f"Error getting event activity summary: {e}")
+            return {
+                "joins": 0,
+                "leaves": 0,
+                "unique_players": 0,
+                "most_active": []
+            }
+    
     # Server Statistics
     async def save_daily_stats(self, stats_data: Dict[str, Any]) -> bool:
         """Save daily server statistics"""
         try:
-            today = datetime.now()
-            today_start = datetime(today.year, today.month, today.day)
+            now = datetime.now()
+            today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
             
             filter_query = {"date": today_start}
             update_data = {
                 "$set": {
                     "date": today_start,
-                    "timestamp": datetime.now(),
+                    "timestamp": now,
                     **stats_data
                 }
             }
@@ -329,9 +825,9 @@ class DatabaseManager:
             cutoff = datetime.now() - timedelta(days=days)
             cutoff_start = datetime(cutoff.year, cutoff.month, cutoff.day)
             
-            cursor = self.db.server_stats.find({
+            cursor = self._analytics_col('server_stats').find({
                 "date": {"$gte": cutoff_start}
-            }).sort("date", ASCENDING)
+            }).sort("date", ASCENDING).batch_size(days + 1)
             
             stats = await cursor.to_list(length=days)
             return stats
@@ -340,11 +836,47 @@ class DatabaseManager:
             logger.error(f"Error getting stats history: {e}")
             return []
     
+    # Leaderboard State
+    async def get_leaderboard_message_id(self, channel_id: int) -> Optional[int]:
+        """Get the stored leaderboard message id for a channel"""
+        try:
+            # Keyed by channel id so the lookup needs no extra index
+            state = await self.db.leaderboard_state.find_one({"_id": channel_id}, {"message_id": 1})
+            return state.get("message_id") if state else None
+            
+        except Exception as e:
+            logger.error(f"Error getting leaderboard message id: {e}")
+            return None
+    
+    async def set_leaderboard_message_id(self, channel_id: int, message_id: int) -> bool:
+        """Store the leaderboard message id for a channel"""
+        try:
+            result = await self.db.leaderboard_state.update_one(
+                {"_id": channel_id},
+                {"$set": {"message_id": message_id, "updated_at": datetime.now()}},
+                upsert=True
+            )
+            return result.acknowledged
+            
+        except Exception as e:
+            logger.error(f"Error saving leaderboard message id: {e}")
+            return False
+    
     # Analytics Queries
+    def _analytics_col(self, name: str):
+        """Get a collection for analytics reads, which may be served by a secondary"""
+        return self.db.get_collection(name, read_preference=ReadPreference.SECONDARY_PREFERRED)
+    
+    async def _aggregate(self, collection, pipeline: List[Dict[str, Any]], length: Optional[int] = None, **kwargs) -> List[Dict[str, Any]]:
+        """Run an aggregation pipeline and return its results as a list"""
+        cursor = await collection.aggregate(pipeline, **kwargs)
+        return await cursor.to_list(length)
+    
     async def get_server_analytics(self, days: int = 7) -> Dict[str, Any]:
         """Get comprehensive server analytics"""
         try:
-            cutoff = datetime.now() - timedelta(days=days)
+            now = datetime.now()
+            cutoff = now - timedelta(days=days)
             
             # Get player statistics
             player_pipeline = [
@@ -358,11 +890,6 @@ class DatabaseManager:
                 }}
             ]
             
-            player_stats = await self.db.players.aggregate(player_pipeline).to_list(1)
-            
-            # Get ping statistics
-            ping_stats = await self.get_ping_stats(hours=days*24)
-            
             # Get event statistics
             event_pipeline = [
                 {"$match": {"timestamp": {"$gte": cutoff}}},
@@ -372,7 +899,12 @@ class DatabaseManager:
                 }}
             ]
             
-            event_stats = await self.db.event_logs.aggregate(event_pipeline).to_list(10)
+            # Player, ping and event queries are independent, run them concurrently
+            player_stats, ping_stats, event_stats = await asyncio.gather(
+                self._aggregate(self._analytics_col('players'), player_pipeline, 1),
+                self.get_ping_stats(hours=days*24),
+                self._aggregate(self._analytics_col('event_logs'), event_pipeline, 10)
+            )
             
             return {
                 "player_stats": player_stats[0] if player_stats else {
@@ -384,7 +916,7 @@ class DatabaseManager:
                 "ping_stats": ping_stats or {},
                 "event_stats": {stat["_id"]: stat["count"] for stat in event_stats},
                 "period_days": days,
-                "generated_at": datetime.now()
+                "generated_at": now
             }
             
         except Exception as e:
@@ -396,77 +928,98 @@ class DatabaseManager:
         try:
             cutoff = datetime.now() - timedelta(hours=hours)
             
-            # Get join/leave events grouped by hour
+            # Get join/leave counts pivoted per hour
             pipeline = [
                 {"$match": {"timestamp": {"$gte": cutoff}}},
                 {"$group": {
-                    "_id": {
-                        "year": {"$year": "$timestamp"},
-                        "month": {"$month": "$timestamp"},
-                        "day": {"$dayOfMonth": "$timestamp"},
-                        "hour": {"$hour": "$timestamp"},
-                        "event_type": "$event_type"
-                    },
-                    "count": {"$sum": 1}
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d-%H", "date": "$timestamp"}},
+                    "joins": {"$sum": {"$cond": [{"$eq": ["$event_type", "join"]}, 1, 0]}},
+                    "leaves": {"$sum": {"$cond": [{"$eq": ["$event_type", "leave"]}, 1, 0]}}
                 }},
-                {"$sort": {"_id.year": 1, "_id.month": 1, "_id.day": 1, "_id.hour": 1}}
+                {"$sort": {"_id": 1}},
+                {"$project": {
+                    "_id": 0,
+                    "hour": "$_id",
+                    "joins": 1,
+                    "leaves": 1,
+                    "net_change": {"$subtract": ["$joins", "$leaves"]}
+                }}
             ]
             
-            results = await self.db.event_logs.aggregate(pipeline).to_list(None)
-            
-            # Process results into hourly data
-            hourly_data = {}
-            for result in results:
-                hour_key = f"{result['_id']['year']}-{result['_id']['month']:02d}-{result['_id']['day']:02d}-{result['_id']['hour']:02d}"
-                if hour_key not in hourly_data:
-                    hourly_data[hour_key] = {"joins": 0, "leaves": 0}
-                
-                if result['_id']['event_type'] == 'join':
-                    hourly_data[hour_key]['joins'] = result['count']
-                elif result['_id']['event_type'] == 'leave':
-                    hourly_data[hour_key]['leaves'] = result['count']
-            
-            return [
-                {
-                    "hour": hour,
-                    "joins": data["joins"],
-                    "leaves": data["leaves"],
-                    "net_change": data["joins"] - data["leaves"]
-                }
-                for hour, data in hourly_data.items()
-            ]
+            cursor = await self._analytics_col('event_logs').aggregate(pipeline)
+            return await cursor.to_list(None)
             
         except Exception as e:
             logger.error(f"Error getting player count over time: {e}")
             return []
     
+    async def get_peak_concurrent_players(self, since: datetime) -> Optional[int]:
+        """Get peak concurrent players since a point in time from join/leave events"""
+        try:
+            pipeline = [
+                {"$match": {
+                    "timestamp": {"$gte": since},
+                    "event_type": {"$in": ["join", "leave"]}
+                }},
+                # Look at each player's previous event so repeated joins/leaves count once
+                {"$setWindowFields": {
+                    "partitionBy": "$player_name",
+                    "sortBy": {"timestamp": 1},
+                    "output": {
+                        "previous_type": {"$shift": {"output": "$event_type", "by": -1, "default": None}}
+                    }
+                }},
+                {"$project": {
+                    "timestamp": 1,
+                    "delta": {"$switch": {
+                        "branches": [
+                            {"case": {"$and": [
+                                {"$eq": ["$event_type", "join"]},
+                                {"$ne": ["$previous_type", "join"]}
+                            ]}, "then": 1},
+                            {"case": {"$and": [
+                                {"$eq": ["$event_type", "leave"]},
+                                {"$eq": ["$previous_type", "join"]}
+                            ]}, "then": -1}
+                        ],
+                        "default": 0
+                    }}
+                }},
+                # Running total of online players over time
+                {"$setWindowFields": {
+                    "sortBy": {"timestamp": 1},
+                    "output": {
+                        "concurrent": {"$sum": "$delta", "window": {"documents": ["unbounded", "current"]}}
+                    }
+                }},
+                {"$group": {"_id": None, "peak": {"$max": "$concurrent"}}}
+            ]
+            
+            cursor = await self.db.event_logs.aggregate(pipeline, allowDiskUse=True)
+            result = await cursor.to_list(1)
+            if result:
+                return max(int(result[0]["peak"]), 0)
+            return None
+            
+        except Exception as e:
+            logger.error(f"Error getting peak concurrent players: {e}")
+            return None
+    
     async def cleanup_old_data(self):
         """Clean up old data based on retention policies"""
         try:
-            # Clean up old ping logs (older than 30 days)
-            ping_cutoff = datetime.now() - timedelta(days=30)
-            ping_result = await self.db.ping_logs.delete_many({
-                "timestamp": {"$lt": ping_cutoff}
-            })
+            now = datetime.now()
             
-            # Clean up old event logs (older than 90 days)
-            event_cutoff = datetime.now() - timedelta(days=90)
-            event_result = await self.db.event_logs.delete_many({
-                "timestamp": {"$lt": event_cutoff}
-            })
+            # Ping logs (30 days) and event logs (90 days) expire through their TTL indexes
             
             # Update players who haven't been seen in 30 days (mark as inactive)
-            inactive_cutoff = datetime.now() - timedelta(days=30)
+            inactive_cutoff = now - timedelta(days=30)
             inactive_result = await self.db.players.update_many(
-                {"lastSeen": {"$lt": inactive_cutoff}},
+                {"lastSeen": {"$lt": inactive_cutoff}, "status": {"$ne": "inactive"}},
                 {"$set": {"status": "inactive"}}
             )
             
-            logger.info(
-                f"Cleanup completed: {ping_result.deleted_count} ping logs, "
-                f"{event_result.deleted_count} events deleted, "
-                f"{inactive_result.modified_count} players marked inactive"
-            )
+            logger.info(f"Cleanup completed: {inactive_result.modified_count} players marked inactive")
             
         except Exception as e:
             logger.error(f"Error during cleanup: {e}")
@@ -474,24 +1027,29 @@ class DatabaseManager:
     # Health Check
     async def health_check(self) -> Dict[str, Any]:
         """Perform database health check"""
+        now = datetime.now()
         try:
             # Test basic operations
             await self.client.admin.command('ping')
             
-            # Get collection counts
-            players_count = await self.db.players.count_documents({})
-            ping_logs_count = await self.db.ping_logs.count_documents({})
-            events_count = await self.db.event_logs.count_documents({})
-            
-            # Get recent activity
-            recent_events = await self.db.event_logs.count_documents({
-                "timestamp": {"$gte": datetime.now() - timedelta(hours=1)}
-            })
-            
-            # Check for recent player activity
-            active_players = await self.db.players.count_documents({
-                "lastSeen": {"$gte": datetime.now() - timedelta(hours=24)}
-            })
+            # Collection counts come from metadata, recent activity counts run concurrently
+            (
+                players_count,
+                ping_logs_count,
+                events_count,
+                recent_events,
+                active_players
+            ) = await asyncio.gather(
+                self.db.players.estimated_document_count(),
+                self.db.ping_logs.estimated_document_count(),
+                self.db.event_logs.estimated_document_count(),
+                self.db.event_logs.count_documents({
+                    "timestamp": {"$gte": now - timedelta(hours=1)}
+                }),
+                self.db.players.count_documents({
+                    "lastSeen": {"$gte": now - timedelta(hours=24)}
+                })
+            )
             
             return {
                 "status": "healthy",
@@ -504,7 +1062,7 @@ class DatabaseManager:
                     "events_last_hour": recent_events,
                     "active_players_24h": active_players
                 },
-                "timestamp": datetime.now()
+                "timestamp": now
             }
             
         except Exception as e:
@@ -512,19 +1070,28 @@ class DatabaseManager:
             return {
                 "status": "unhealthy",
                 "error": str(e),
-                "timestamp": datetime.now()
+                "timestamp": now
             }
     
     async def get_player_search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Search for players by name (partial match)"""
         try:
-            # Use regex for partial matching
+            # Anchored prefix match on the lowercased name can use the name_lc index
+            pattern = re.escape(query.lower())
             cursor = self.db.players.find({
-                "name": {"$regex": query, "$options": "i"}
+                "name_lc": {"$regex": f"^{pattern}"}
             }).sort("playtime", DESCENDING).limit(limit)
             
             players = await cursor.to_list(length=limit)
-            return players
+            if players:
+                return players
+            
+            # Fall back to a partial match anywhere in the name
+            cursor = self.db.players.find({
+                "name_lc": {"$regex": pattern}
+            }).sort("playtime", DESCENDING).limit(limit)
+            
+            return await cursor.to_list(length=limit)
             
         except Exception as e:
             logger.error(f"Error searching for players with query '{query}': {e}")
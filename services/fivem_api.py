@@ -1,68 +1,145 @@
 import aiohttp
 import asyncio
 import logging
-import json
+import orjson
 import re
-from typing import Optional, Dict, List, Any
+import time
+from typing import Optional, Dict, List, Any, Tuple
 from datetime import datetime
+from types import MappingProxyType
+from services.http_client import get_session
 
 logger = logging.getLogger(__name__)
 
+# Fallback patterns for responses that aren't plain JSON, matched on raw bytes
+_HTML_JSON_RE = re.compile(rb'[\{\[].*[\}\]]', re.DOTALL)
+_JSONP_RE = re.compile(rb'[\w.]+\s*\(\s*([\{\[].*[\}\]])\s*\)', re.DOTALL)
+
+# Server JSON is typically well under 64 KiB, anything past this is rejected
+MAX_RESPONSE_BYTES = 512 * 1024
+
+# Player names that mean the entry has no usable name
+_BAD_NAMES = frozenset({'unknown', '', 'null'})
+
+# Status reported when the server can't be reached, copied with a fresh 'vars' dict per use
+_OFFLINE_STATUS = MappingProxyType({
+    'online': False,
+    'hostname': 'Motionlife RP',
+    'clients': 0,
+    'maxClients': 128,
+    'mapname': 'San Andreas',
+    'gametype': 'Roleplay',
+    'serverVersion': 'Unknown',
+    'ping': 0
+})
+
+# Seconds a successful response is reused per endpoint
+_CACHE_TTL = {
+    '/info.json': 60.0,  # Only changes on server restart
+    '/dynamic.json': 3.0,
+    '/players.json': 1.0
+}
+
+def _build_player(player_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Build a player entry from /players.json data, None for unnamed players"""
+    # Clean and validate player data
+    player_name = str(player_data.get('name', '')).strip()
+    if not player_name or player_name.lower() in _BAD_NAMES:
+        return None
+    
+    # Extract useful identifiers
+    identifiers = player_data.get('identifiers', [])
+    parsed_identifiers = {}
+    if isinstance(identifiers, list):
+        parsed_identifiers = {
+            key: value
+            for key, sep, value in (i.partition(':') for i in identifiers if isinstance(i, str))
+            if sep
+        }
+    
+    return {
+        'id': int(player_data.get('id', 0)),
+        'name': player_name,
+        'ping': int(player_data.get('ping', 0)),
+        'identifiers': identifiers,
+        'parsed_identifiers': parsed_identifiers,
+        'endpoint': player_data.get('endpoint', ''),
+        # Default values since they're not in the API
+        'job': 'civilian',
+        'role': 'civilian'
+    }
+
 class FiveMAPI:
     """Robust FiveM Server API Client - Handles all response types"""
     
+    __slots__ = ('base_url', 'timeout', '_cache', '_inflight', '_latency_ms', '_body_bytes')
+    
     def __init__(self, base_url: str, timeout: int = 15):
         # Clean and validate base URL
         self.base_url = base_url.rstrip('/')
         self.timeout = aiohttp.ClientTimeout(total=timeout)
-        self.session: Optional[aiohttp.ClientSession] = None
+        
+        # endpoint -> (fetched at, data), concurrent requests share one in-flight fetch
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # endpoint -> round-trip time of the last network fetch in ms
+        self._latency_ms: Dict[str, float] = {}
+        # endpoint -> size in bytes of the last response body
+        self._body_bytes: Dict[str, int] = {}
         
     async def _get_session(self) -> aiohttp.ClientSession:
-        """Get or create HTTP session with proper headers"""
-        if self.session is None or self.session.closed:
-            headers = {
-                'User-Agent': 'MotionlifeBot/1.0 (FiveM Server Monitor)',
-                'Accept': 'application/json, text/plain, text/html, */*',
-                'Accept-Encoding': 'gzip, deflate',
-                'Connection': 'keep-alive'
-            }
-            self.session = aiohttp.ClientSession(
-                timeout=self.timeout,
-                headers=headers
-            )
-        return self.session
+        """Get the process-wide HTTP session"""
+        return await get_session()
     
     async def _make_request(self, endpoint: str) -> Optional[Dict[str, Any]]:
-        """Make HTTP request to FiveM API with robust parsing"""
-        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        """Make HTTP request to FiveM API, served from cache within the endpoint's TTL"""
+        endpoint = '/' + endpoint.lstrip('/')
+        
+        ttl = _CACHE_TTL.get(endpoint)
+        cached = self._cache.get(endpoint)
+        if ttl and cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        
+        future = self._inflight.get(endpoint)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(endpoint))
+            self._inflight[endpoint] = future
+            future.add_done_callback(lambda _: self._inflight.pop(endpoint, None))
+        
+        # Shield so one cancelled caller doesn't cancel the shared fetch
+        return await asyncio.shield(future)
+    
+    async def _fetch(self, endpoint: str) -> Optional[Dict[str, Any]]:
+        """Fetch an endpoint over HTTP with robust parsing"""
+        url = f"{self.base_url}{endpoint}"
         
         try:
             session = await self._get_session()
+            start = time.perf_counter_ns()
             
-            async with session.get(url) as response:
+            async with session.get(url, timeout=self.timeout) as response:
                 logger.debug(f"Request to {url} - Status: {response.status}, Content-Type: {response.content_type}")
                 
                 if response.status == 200:
-                    # Get raw response
-                    try:
-                        raw_text = await response.text(encoding='utf-8')
-                    except UnicodeDecodeError:
-                        # Try with different encoding
-                        try:
-                            raw_bytes = await response.read()
-                            raw_text = raw_bytes.decode('utf-8', errors='ignore')
-                        except:
-                            raw_text = str(await response.read())
+                    # Get raw response, orjson parses bytes without decoding to str first
+                    raw_bytes = await self._read_bounded(response)
+                    if raw_bytes is None:
+                        logger.warning(f"Response from {url} exceeds {MAX_RESPONSE_BYTES} bytes, ignoring")
+                        return None
                     
-                    # Clean and validate response
-                    if not raw_text or not raw_text.strip():
+                    # Validate response
+                    if not raw_bytes or not raw_bytes.strip():
                         logger.warning(f"Empty response from {url}")
                         return None
                     
-                    cleaned_text = raw_text.strip()
+                    self._latency_ms[endpoint] = (time.perf_counter_ns() - start) / 1e6
+                    self._body_bytes[endpoint] = len(raw_bytes)
                     
                     # Try to parse as JSON
-                    return self._parse_json_response(cleaned_text, url)
+                    data = self._parse_json_response(raw_bytes, url)
+                    if data is not None:
+                        self._cache[endpoint] = (time.monotonic(), data)
+                    return data
                     
                 elif response.status == 404:
                     logger.warning(f"Endpoint not found: {url}")
@@ -84,63 +161,72 @@ class FiveMAPI:
             logger.error(f"Unexpected error requesting {url}: {e}")
             return None
     
-    def _parse_json_response(self, text: str, url: str) -> Optional[Dict[str, Any]]:
+    async def _read_bounded(self, response: aiohttp.ClientResponse) -> Optional[bytes]:
+        """Read the response body, or None if it exceeds MAX_RESPONSE_BYTES"""
+        body = bytearray()
+        # Read at most one byte past the cap to detect oversized bodies
+        while len(body) <= MAX_RESPONSE_BYTES:
+            chunk = await response.content.read(MAX_RESPONSE_BYTES + 1 - len(body))
+            if not chunk:
+                return bytes(body)
+            body += chunk
+        return None
+    
+    def _parse_json_response(self, raw: bytes, url: str) -> Optional[Dict[str, Any]]:
         """Parse JSON response with multiple fallback methods"""
         
-        # Method 1: Direct JSON parsing
+        # A UTF-8 byte order mark is not valid JSON, drop it up front
+        if raw.startswith(b'\xef\xbb\xbf'):
+            raw = raw[3:]
+        
+        # Method 1: Direct JSON parsing of the raw bytes (the common case)
         try:
-            data = json.loads(text)
+            data = orjson.loads(raw)
             logger.debug(f"Successfully parsed JSON from {url}")
             return data
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             pass
         
-        # Method 2: Check if it looks like JSON and clean it
-        if (text.startswith('{') and text.endswith('}')) or (text.startswith('[') and text.endswith(']')):
+        # Fallbacks work on the raw bytes, dropping invalid UTF-8 so orjson can parse them
+        try:
+            raw.decode('utf-8')
+        except UnicodeDecodeError:
+            raw = raw.decode('utf-8', errors='ignore').encode('utf-8')
             try:
-                # Remove any non-JSON content before/after
-                # Find first { or [
-                start_idx = min(text.find('{'), text.find('['))
-                if start_idx == -1:
-                    start_idx = max(text.find('{'), text.find('['))
-                
-                # Find last } or ]
-                end_idx = max(text.rfind('}'), text.rfind(']'))
-                
-                if start_idx >= 0 and end_idx > start_idx:
-                    clean_json = text[start_idx:end_idx+1]
-                    data = json.loads(clean_json)
-                    logger.debug(f"Successfully parsed cleaned JSON from {url}")
-                    return data
-            except (json.JSONDecodeError, ValueError):
+                data = orjson.loads(raw)
+                logger.debug(f"Successfully parsed cleaned JSON from {url}")
+                return data
+            except orjson.JSONDecodeError:
                 pass
+        raw = raw.strip()
         
-        # Method 3: Try to extract JSON from HTML response
-        if '<html' in text.lower() or '<!doctype' in text.lower():
+        # Method 2: Try to extract JSON from HTML response, sniffing only the head of the body
+        head = raw[:512].lower()
+        if b'<html' in head or b'<!doctype' in head:
             # Sometimes FiveM servers wrap JSON in HTML
-            json_match = re.search(r'(\{.*\}|\[.*\])', text, re.DOTALL)
+            json_match = _HTML_JSON_RE.search(raw)
             if json_match:
                 try:
-                    data = json.loads(json_match.group(1))
+                    data = orjson.loads(json_match.group(0))
                     logger.debug(f"Extracted JSON from HTML response from {url}")
                     return data
-                except json.JSONDecodeError:
+                except orjson.JSONDecodeError:
                     pass
         
-        # Method 4: Check for JSONP or JavaScript wrapping
-        jsonp_match = re.search(r'[\w\.]+\s*\(\s*(\{.*\}|\[.*\])\s*\)', text, re.DOTALL)
+        # Method 3: Check for JSONP or JavaScript wrapping
+        jsonp_match = _JSONP_RE.search(raw)
         if jsonp_match:
             try:
-                data = json.loads(jsonp_match.group(1))
+                data = orjson.loads(jsonp_match.group(1))
                 logger.debug(f"Extracted JSON from JSONP response from {url}")
                 return data
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 pass
         
         # Log the failure with sample of response
         logger.error(f"Failed to parse JSON from {url}")
-        logger.debug(f"Response sample (first 200 chars): {text[:200]}")
-        logger.debug(f"Response sample (last 200 chars): {text[-200:]}")
+        logger.debug(f"Response sample (first 200 bytes): {raw[:200]!r}")
+        logger.debug(f"Response sample (last 200 bytes): {raw[-200:]!r}")
         return None
     
     async def get_server_info(self) -> Optional[Dict[str, Any]]:
@@ -166,13 +252,11 @@ class FiveMAPI:
     async def get_server_status(self) -> Optional[Dict[str, Any]]:
         """Get server status from /dynamic.json"""
         try:
-            start_time = datetime.now()
             data = await self._make_request('/dynamic.json')
-            end_time = datetime.utcnow()
             
             if data and isinstance(data, dict):
-                # Calculate ping from response time
-                ping_ms = (end_time - start_time).total_seconds() * 1000
+                # Ping is the round-trip time of the last real fetch, not of a cache hit
+                ping_ms = self._latency_ms.get('/dynamic.json', 0)
                 
                 # Extract server variables
                 vars_data = data.get('vars', {})
@@ -189,31 +273,11 @@ class FiveMAPI:
                     'vars': vars_data
                 }
             else:
-                return {
-                    'online': False,
-                    'hostname': 'Motionlife RP',
-                    'clients': 0,
-                    'maxClients': 128,
-                    'mapname': 'San Andreas',
-                    'gametype': 'Roleplay',
-                    'serverVersion': 'Unknown',
-                    'ping': 0,
-                    'vars': {}
-                }
+                return {**_OFFLINE_STATUS, 'vars': {}}
                 
         except Exception as e:
             logger.error(f"Error getting server status: {e}")
-            return {
-                'online': False,
-                'hostname': 'Motionlife RP',
-                'clients': 0,
-                'maxClients': 128,
-                'mapname': 'San Andreas',
-                'gametype': 'Roleplay',
-                'serverVersion': 'Unknown',
-                'ping': 0,
-                'vars': {}
-            }
+            return {**_OFFLINE_STATUS, 'vars': {}}
     
     async def get_players(self) -> Optional[List[Dict[str, Any]]]:
         """Get current players from /players.json"""
@@ -221,38 +285,8 @@ class FiveMAPI:
             data = await self._make_request('/players.json')
             
             if data and isinstance(data, list):
-                players = []
-                for player_data in data:
-                    if isinstance(player_data, dict):
-                        # Parse identifiers
-                        identifiers = player_data.get('identifiers', [])
-                        
-                        # Extract useful identifiers
-                        parsed_identifiers = {}
-                        if isinstance(identifiers, list):
-                            for identifier in identifiers:
-                                if isinstance(identifier, str) and ':' in identifier:
-                                    key, value = identifier.split(':', 1)
-                                    parsed_identifiers[key] = value
-                        
-                        # Clean and validate player data
-                        player_name = str(player_data.get('name', '')).strip()
-                        if not player_name or player_name.lower() in ['unknown', '', 'null']:
-                            continue
-                        
-                        player = {
-                            'id': int(player_data.get('id', 0)),
-                            'name': player_name,
-                            'ping': int(player_data.get('ping', 0)),
-                            'identifiers': identifiers,
-                            'parsed_identifiers': parsed_identifiers,
-                            'endpoint': player_data.get('endpoint', ''),
-                            # Default values since they're not in the API
-                            'job': 'civilian',
-                            'role': 'civilian'
-                        }
-                        
-                        players.append(player)
+                built = (_build_player(player_data) for player_data in data if isinstance(player_data, dict))
+                players = [player for player in built if player is not None]
                 
                 logger.debug(f"Successfully parsed {len(players)} players")
                 return players
@@ -286,6 +320,11 @@ class FiveMAPI:
     
     async def get_comprehensive_server_data(self) -> Optional[Dict[str, Any]]:
         """Get all server data in one call"""
+        # Start the additional requests alongside the status request, they're
+        # only used once the status says the server is online
+        info_task = asyncio.create_task(self.get_server_info())
+        players_task = asyncio.create_task(self.get_players())
+        
         try:
             # Get status first (most important)
             status_data = await self.get_server_status()
@@ -293,10 +332,8 @@ class FiveMAPI:
             if not status_data or not status_data.get('online', False):
                 # Server is offline
                 return {
-                    'online': False,
-                    'hostname': 'Motionlife RP',
-                    'clients': 0,
-                    'maxClients': 128,
+                    **_OFFLINE_STATUS,
+                    'vars': {},
                     'players': [],
                     'resources': [],
                     'server_vars': {},
@@ -305,14 +342,11 @@ class FiveMAPI:
             
             # Server is online, get additional data
             try:
-                info_task = asyncio.create_task(self.get_server_info())
-                players_task = asyncio.create_task(self.get_players())
-                
                 # Wait for both with timeout
-                info_data, players_data = await asyncio.wait_for(
-                    asyncio.gather(info_task, players_task, return_exceptions=True),
-                    timeout=10.0
-                )
+                async with asyncio.timeout(10.0):
+                    info_data, players_data = await asyncio.gather(
+                        info_task, players_task, return_exceptions=True
+                    )
                 
                 # Handle exceptions
                 if isinstance(info_data, Exception):
@@ -339,6 +373,10 @@ class FiveMAPI:
         except Exception as e:
             logger.error(f"Error getting comprehensive server data: {e}")
             return None
+        finally:
+            # Unused when offline, shared fetches keep running behind their shield
+            info_task.cancel()
+            players_task.cancel()
     
     async def test_connection(self) -> Dict[str, Any]:
         """Test API connection to all endpoints"""
@@ -357,33 +395,39 @@ class FiveMAPI:
             'players': '/players.json'
         }
         
-        for name, endpoint in endpoints.items():
-            try:
-                start_time = datetime.now()
-                data = await self._make_request(endpoint)
-                end_time = datetime.now()
-                
-                response_time = (end_time - start_time).total_seconds() * 1000
-                
-                if data is not None:
-                    results[name] = True
-                    results['details'][name] = {
-                        'status': 'success',
-                        'response_time_ms': round(response_time, 2),
-                        'data_type': type(data).__name__,
-                        'data_size': len(str(data)) if data else 0
-                    }
-                else:
-                    results['details'][name] = {
-                        'status': 'failed',
-                        'response_time_ms': round(response_time, 2),
-                        'error': 'No data returned'
-                    }
-                    
-            except Exception as e:
+        async def probe(endpoint: str) -> Tuple[Any, float]:
+            start = time.perf_counter_ns()
+            data = await self._make_request(endpoint)
+            return data, (time.perf_counter_ns() - start) / 1e6
+        
+        # Probe all endpoints concurrently
+        probes = await asyncio.gather(
+            *(probe(endpoint) for endpoint in endpoints.values()),
+            return_exceptions=True
+        )
+        
+        for (name, endpoint), outcome in zip(endpoints.items(), probes):
+            if isinstance(outcome, Exception):
                 results['details'][name] = {
                     'status': 'error',
-                    'error': str(e)
+                    'error': str(outcome)
+                }
+                continue
+            
+            data, response_time = outcome
+            if data is not None:
+                results[name] = True
+                results['details'][name] = {
+                    'status': 'success',
+                    'response_time_ms': round(response_time, 2),
+                    'data_type': type(data).__name__,
+                    'data_size': self._body_bytes.get(endpoint, 0) if data else 0
+                }
+            else:
+                results['details'][name] = {
+                    'status': 'failed',
+                    'response_time_ms': round(response_time, 2),
+                    'error': 'No data returned'
                 }
         
         results['overall'] = any([results['info'], results['dynamic'], results['players']])
@@ -391,10 +435,7 @@ class FiveMAPI:
         return results
     
     async def close(self):
-        """Close HTTP session"""
-        if self.session and not self.session.closed:
-            await self.session.close()
-            logger.debug("FiveM API session closed")
+        """Release the client, the shared HTTP session is closed on shutdown via close_session"""
     
     async def __aenter__(self):
         return self
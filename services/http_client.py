@@ -0,0 +1,48 @@
+import aiohttp
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# aiohttp decodes br responses only when a Brotli binding is installed
+try:
+    import brotli  # noqa: F401
+    _ACCEPT_ENCODING = 'br, gzip, deflate'
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        _ACCEPT_ENCODING = 'br, gzip, deflate'
+    except ImportError:
+        _ACCEPT_ENCODING = 'gzip, deflate'
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'MotionlifeBot/1.0 (FiveM Server Monitor)',
+    'Accept': 'application/json, text/plain, text/html, */*',
+    'Accept-Encoding': _ACCEPT_ENCODING,
+    'Connection': 'keep-alive'
+}
+
+_session: Optional[aiohttp.ClientSession] = None
+
+async def get_session() -> aiohttp.ClientSession:
+    """Get the shared HTTP session, creating it on first use"""
+    global _session
+    if _session is None or _session.closed:
+        # One pooled connector per process so keep-alive connections are reused
+        connector = aiohttp.TCPConnector(
+            limit=100,
+            limit_per_host=10,
+            ttl_dns_cache=30,
+            enable_cleanup_closed=True,
+            keepalive_timeout=75
+        )
+        _session = aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS)
+    return _session
+
+async def close_session():
+    """Close the shared HTTP session"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.debug("Shared HTTP session closed")
+    _session = None
@@ -1,18 +1,33 @@
+import asyncio
 import discord
 import logging
+import time
 from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional
 from services.database import DatabaseManager
+from utils.async_cache import async_ttl_cache
 from utils.helpers import format_playtime, get_role_emoji, get_job_emoji, create_embed_template
 
 logger = logging.getLogger(__name__)
 
+# Seconds a rendered leaderboard embed or top players list is reused. Player writes
+# don't invalidate these caches, so this TTL alone bounds how stale a leaderboard gets
+LEADERBOARD_CACHE_TTL = 30
+
+# Top players fetched per category, smaller requests are served by slicing
+LEADERBOARD_POOL_SIZE = 10
+
+# Row prefixes by zero-based position, medals for the top 3
+_POSITION_PREFIXES = ["🥇", "🥈", "🥉"] + [f"`{position:2d}.`" for position in range(4, 101)]
+
 class LeaderboardManager:
     """Leaderboard Manager for player rankings"""
     
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
         self.last_message_id: Optional[int] = None
+        # The stored message id is loaded once, on the first update after startup
+        self._message_id_loaded = False
         self.leaderboard_types = {
             'playtime': 'Top Players by Playtime',
             'sessions': 'Most Active Players',
@@ -21,6 +36,18 @@ class LeaderboardManager:
     
     async def get_top_players(self, limit: int = 10, category: str = 'playtime') -> List[Dict[str, Any]]:
         """Get top players by specified category"""
+        if limit <= LEADERBOARD_POOL_SIZE:
+            players = await self._get_top_players_pool(category)
+            return players[:limit]
+        return await self._query_top_players(limit, category)
+    
+    @async_ttl_cache(ttl=LEADERBOARD_CACHE_TTL)
+    async def _get_top_players_pool(self, category: str) -> List[Dict[str, Any]]:
+        """Get the top LEADERBOARD_POOL_SIZE players for a category, shared by all smaller limits"""
+        return await self._query_top_players(LEADERBOARD_POOL_SIZE, category)
+    
+    async def _query_top_players(self, limit: int, category: str) -> List[Dict[str, Any]]:
+        """Query top players by specified category"""
         try:
             if category == 'playtime':
                 return await self.db.get_players_by_playtime(limit)
@@ -36,7 +63,10 @@ class LeaderboardManager:
     async def _get_recently_active_players(self, limit: int) -> List[Dict[str, Any]]:
         """Get recently active players"""
         try:
-            cursor = self.db.db.players.find({}).sort("lastSeen", -1).limit(limit)
+            # Only the fields the leaderboard renders, walked in lastSeen index order
+            cursor = self.db.db.players.find(
+                {}, self.db.LEADERBOARD_PROJECTION
+            ).sort("lastSeen", -1).limit(limit)
             players = await cursor.to_list(length=limit)
             return players
             
@@ -47,116 +77,115 @@ class LeaderboardManager:
     async def create_leaderboard_embed(self, category: str = 'playtime', limit: int = 10) -> discord.Embed:
         """Create leaderboard embed"""
         try:
-            players = await self.get_top_players(limit, category)
-            
-            embed = create_embed_template(
-                title=f"🏆 {self.leaderboard_types.get(category, 'Leaderboard')}",
-                color=discord.Color.gold()
-            )
-            
-            if not players:
-                embed.add_field(
-                    name="No Data",
-                    value="No players found in database.",
-                    inline=False
-                )
-                return embed
+            # Copy so callers can retitle the embed without touching the cached one
+            embed = await self._build_leaderboard_embed(category, limit)
+            return embed.copy()
             
-            # Create leaderboard text
-            leaderboard_text = ""
-            medals = ["🥇", "🥈", "🥉"]
-            
-            for i, player in enumerate(players):
-                position = i + 1
-                
-                # Get position emoji
-                if position <= 3:
-                    position_emoji = medals[i]
-                else:
-                    position_emoji = f"`{position:2d}.`"
-                
-                # Format player info based on category
-                if category == 'playtime':
-                    value = format_playtime(player.get('playtime', 0))
-                    extra_info = f"({player.get('totalSessions', 0)} sessions)"
-                elif category == 'recent':
-                    last_seen = player.get('lastSeen')
-                    if last_seen:
-                        value = f"<t:{int(last_seen.timestamp())}:R>"
-                    else:
-                        value = "Unknown"
-                    extra_info = format_playtime(player.get('playtime', 0))
-                else:
-                    value = str(player.get('playtime', 0))
-                    extra_info = ""
-                
-                # Get role and job emojis
-                role_emoji = get_role_emoji(player.get('role', 'civilian'))
-                job_emoji = get_job_emoji(player.get('job', 'unemployed'))
-                
-                # Build player line
-                player_name = player.get('name', 'Unknown')[:20]  # Limit name length
-                
-                leaderboard_text += f"{position_emoji} {role_emoji} **{player_name}**\n"
-                leaderboard_text += f"    {job_emoji} {value} {extra_info}\n"
-                
-                # Add separator for top 3
-                if position == 3 and len(players) > 3:
-                    leaderboard_text += "\n"
+        except Exception as e:
+            logger.error(f"Error creating leaderboard embed: {e}")
             
-            embed.add_field(
-                name=f"Top {len(players)} Players",
-                value=leaderboard_text,
-                inline=False
+            # Return error embed
+            return create_embed_template(
+                title="❌ Leaderboard Error",
+                color=discord.Color.red(),
+                description="Failed to load leaderboard data."
             )
-            
-            # Add statistics
+    
+    @async_ttl_cache(ttl=LEADERBOARD_CACHE_TTL)
+    async def _build_leaderboard_embed(self, category: str, limit: int) -> discord.Embed:
+        """Build a leaderboard embed, cached per (category, limit)"""
+        players = await self.get_top_players(limit, category)
+        title = f"🏆 {self.leaderboard_types.get(category, 'Leaderboard')}"
+        
+        if not players:
+            return create_embed_template(
+                title=title,
+                color=discord.Color.gold(),
+                description="No players found in database."
+            )
+        
+        embed = create_embed_template(title=title, color=discord.Color.gold())
+        
+        # Create leaderboard text, totalling playtime in the same pass
+        lines = []
+        total_playtime = 0
+        
+        for i, player in enumerate(players):
+            position = i + 1
+            playtime = player.get('playtime', 0)
+            total_playtime += playtime
+            
+            # Get position emoji
+            position_emoji = _POSITION_PREFIXES[i] if i < len(_POSITION_PREFIXES) else f"`{position:2d}.`"
+            
+            # Format player info based on category
             if category == 'playtime':
-                total_playtime = sum(player.get('playtime', 0) for player in players)
-                avg_playtime = total_playtime / len(players) if players else 0
-                
-                embed.add_field(
-                    name="📊 Statistics",
-                    value=f"Total Playtime: {format_playtime(total_playtime)}\n"
-                          f"Average: {format_playtime(int(avg_playtime))}",
-                    inline=True
-                )
+                value = format_playtime(playtime)
+                extra_info = f"({player.get('totalSessions', 0)} sessions)"
+            elif category == 'recent':
+                last_seen = player.get('lastSeen')
+                if last_seen:
+                    value = f"<t:{int(last_seen.timestamp())}:R>"
+                else:
+                    value = "Unknown"
+                extra_info = format_playtime(playtime)
+            else:
+                value = str(playtime)
+                extra_info = ""
             
-            embed.add_field(
-                name="🔄 Last Updated",
-                value=f"<t:{int(datetime.now().timestamp())}:R>",
-                inline=True
-            )
+            # Get role and job emojis
+            role_emoji = get_role_emoji(player.get('role', 'civilian'))
+            job_emoji = get_job_emoji(player.get('job', 'unemployed'))
             
-            return embed
+            # Build player line
+            player_name = player.get('name', 'Unknown')[:20]  # Limit name length
             
-        except Exception as e:
-            logger.error(f"Error creating leaderboard embed: {e}")
+            lines.append(f"{position_emoji} {role_emoji} **{player_name}**\n")
+            lines.append(f"    {job_emoji} {value} {extra_info}\n")
+            
+            # Add separator for top 3
+            if position == 3 and len(players) > 3:
+                lines.append("\n")
+        
+        # The description allows 4096 characters against a field's 1024
+        embed.description = "".join(lines)
+        
+        # Add statistics
+        if category == 'playtime':
+            avg_playtime = total_playtime / len(players)
             
-            # Return error embed
-            embed = create_embed_template(
-                title="❌ Leaderboard Error",
-                color=discord.Color.red()
-            )
             embed.add_field(
-                name="Error",
-                value="Failed to load leaderboard data.",
-                inline=False
+                name="📊 Statistics",
+                value=f"Total Playtime: {format_playtime(total_playtime)}\n"
+                      f"Average: {format_playtime(int(avg_playtime))}",
+                inline=True
             )
-            return embed
+        
+        embed.add_field(
+            name="🔄 Last Updated",
+            value=f"<t:{int(time.time())}:R>",
+            inline=True
+        )
+        
+        return embed
     
     async def update_leaderboard_message(self, channel: discord.TextChannel):
         """Update or create leaderboard message in channel"""
         try:
-            # Create main leaderboard embed
-            main_embed = await self.create_leaderboard_embed('playtime', 10)
-            
-            # Create additional embeds for different categories
-            recent_embed = await self.create_leaderboard_embed('recent', 5)
+            # Create main and recent leaderboard embeds concurrently
+            main_embed, recent_embed = await asyncio.gather(
+                self.create_leaderboard_embed('playtime', 10),
+                self.create_leaderboard_embed('recent', 5)
+            )
             recent_embed.title = "🕒 Recently Active Players"
             
             embeds = [main_embed, recent_embed]
             
+            # Pick up the message posted before a restart instead of sending a new one
+            if not self._message_id_loaded:
+                self.last_message_id = await self.db.get_leaderboard_message_id(channel.id)
+                self._message_id_loaded = True
+            
             # Try to edit existing message or create new one
             if self.last_message_id:
                 try:
@@ -173,6 +202,7 @@ class LeaderboardManager:
             # Create new message
             message = await channel.send(embeds=embeds)
             self.last_message_id = message.id
+            await self.db.set_leaderboard_message_id(channel.id, message.id)
             logger.info("Created new leaderboard message")
             
         except Exception as e:
@@ -186,14 +216,14 @@ class LeaderboardManager:
             if not player:
                 return None
             
-            # Get all players sorted by playtime to find rank
-            all_players = await self.db.get_players_by_playtime(limit=1000)
-            
+            # Rank is one more than the number of players with more playtime,
+            # counted on the playtime index; players without playtime are unranked
+            playtime = player.get('playtime', 0)
             player_rank = None
-            for i, p in enumerate(all_players):
-                if p.get('name') == player_name:
-                    player_rank = i + 1
-                    break
+            if playtime > 0:
+                player_rank = await self.db.db.players.count_documents(
+                    {"playtime": {"$gt": playtime}}
+                ) + 1
             
             embed = create_embed_template(
                 title=f"📊 Player Rank: {player_name}",
@@ -235,9 +265,10 @@ class LeaderboardManager:
                 inline=True
             )
             
+            last_seen = player.get('lastSeen')
             embed.add_field(
                 name="📅 Last Seen",
-                value=f"<t:{int(player.get('lastSeen', datetime.now()).timestamp())}:R>",
+                value=f"<t:{int(last_seen.timestamp() if last_seen else time.time())}:R>",
                 inline=True
             )
             
@@ -250,8 +281,9 @@ class LeaderboardManager:
     async def get_player_comparison(self, player1: str, player2: str) -> Optional[discord.Embed]:
         """Create player comparison embed"""
         try:
-            p1_data = await self.db.get_player(player1)
-            p2_data = await self.db.get_player(player2)
+            players = await self.db.get_players_by_names([player1, player2])
+            p1_data = players.get(player1)
+            p2_data = players.get(player2)
             
             if not p1_data or not p2_data:
                 return None
@@ -309,17 +341,13 @@ class LeaderboardManager:
     async def create_rotating_leaderboards(self) -> List[discord.Embed]:
         """Create multiple leaderboard embeds for rotation"""
         try:
-            embeds = []
-            
-            # Main playtime leaderboard
-            playtime_embed = await self.create_leaderboard_embed('playtime', 10)
-            embeds.append(playtime_embed)
-            
-            # Recent players leaderboard
-            recent_embed = await self.create_leaderboard_embed('recent', 10)
-            embeds.append(recent_embed)
+            # Main playtime and recent players leaderboards, built concurrently
+            embeds = await asyncio.gather(
+                self.create_leaderboard_embed('playtime', 10),
+                self.create_leaderboard_embed('recent', 10)
+            )
             
-            return embeds
+            return list(embeds)
             
         except Exception as e:
             logger.error(f"Error creating rotating leaderboards: {e}")
@@ -328,31 +356,42 @@ class LeaderboardManager:
     async def get_leaderboard_statistics(self) -> Dict[str, Any]:
         """Get overall leaderboard statistics"""
         try:
-            total_players = await self.db.db.players.count_documents({})
-            
-            # Get top player
-            top_players = await self.get_top_players(1)
-            top_player = top_players[0] if top_players else None
-            
-            # Calculate total server playtime
+            # Totals and the top player in one round trip
             pipeline = [
-                {"$group": {
-                    "_id": None,
-                    "total_playtime": {"$sum": "$playtime"},
-                    "avg_playtime": {"$avg": "$playtime"}
+                {"$facet": {
+                    "totals": [
+                        {"$group": {
+                            "_id": None,
+                            "total_players": {"$sum": 1},
+                            "total_playtime": {"$sum": "$playtime"},
+                            "avg_playtime": {"$avg": "$playtime"}
+                        }}
+                    ],
+                    # Same filter and ordering as get_top_players
+                    "top": [
+                        {"$match": {"playtime": {"$gt": 0}}},
+                        {"$sort": {"playtime": -1}},
+                        {"$limit": 1},
+                        {"$project": self.db.LEADERBOARD_PROJECTION}
+                    ]
+                }},
+                # Flatten the facets into the result shape, with defaults for an empty collection
+                {"$project": {
+                    "_id": 0,
+                    "total_players": {"$ifNull": [{"$arrayElemAt": ["$totals.total_players", 0]}, 0]},
+                    "top_player": {"$ifNull": [{"$arrayElemAt": ["$top", 0]}, None]},
+                    "total_server_playtime": {"$ifNull": [{"$arrayElemAt": ["$totals.total_playtime", 0]}, 0]},
+                    "average_playtime": {"$ifNull": [{"$arrayElemAt": ["$totals.avg_playtime", 0]}, 0]}
                 }}
             ]
             
-            result = await self.db.db.players.aggregate(pipeline).to_list(1)
+            cursor = await self.db.db.players.aggregate(pipeline)
+            result = await cursor.to_list(1)
             stats = result[0] if result else {}
             
-            return {
-                'total_players': total_players,
-                'top_player': top_player,
-                'total_server_playtime': stats.get('total_playtime', 0),
-                'average_playtime': stats.get('avg_playtime', 0),
-                'generated_at': datetime.now()
-            }
+            # Stored timestamps are naive local time, so stamp locally rather than with $$NOW (UTC)
+            stats['generated_at'] = datetime.now()
+            return stats
             
         except Exception as e:
             logger.error(f"Error getting leaderboard statistics: {e}")
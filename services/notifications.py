@@ -1,47 +1,83 @@
+import asyncio
 import discord
 import logging
+import time
 from datetime import datetime, timezone, timedelta
-from typing import List, Dict, Any, Set
-from utils.helpers import format_ping, get_role_emoji, get_job_emoji, create_embed_template
+from typing import List, Dict, Any, Optional, Set
+from utils.helpers import format_ping, format_playtime, get_role_emoji, get_job_emoji, create_embed_template
 
 logger = logging.getLogger(__name__)
 
+# Shared embed styling, built once
+_FOOTER_TEXT = "Motionlife Roleplay"
+_COLOR_GREEN = discord.Color.green()
+_COLOR_RED = discord.Color.red()
+_COLOR_ORANGE = discord.Color.orange()
+_COLOR_GOLD = discord.Color.gold()
+_COLOR_BLUE = discord.Color.blue()
+
 class NotificationManager:
     """Manage player join/leave notifications"""
     
     def __init__(self, bot):
         self.bot = bot
         self.previous_players: Set[str] = set()
-        self.player_join_times: Dict[str, datetime] = {}
+        # Player name -> join time in epoch seconds
+        self.player_join_times: Dict[str, float] = {}
+        self._channel = None
         
     async def check_player_changes(self, current_players_data: List[Dict[str, Any]]):
         """Check for player join/leave events and send notifications"""
         try:
-            # Extract current player names
             current_players = {player.get('name') for player in current_players_data if player.get('name')}
             
+            # Nothing to do on the common tick where nobody joined or left
+            if current_players == self.previous_players:
+                return
+            
+            # One timestamp for every event and embed in this check
+            now = time.time()
+            
+            # Index current players by name, reversed so the first entry for a name wins
+            players_by_name = {
+                player['name']: player
+                for player in reversed(current_players_data) if player.get('name')
+            }
+            
             # Find players who joined
             joined_players = current_players - self.previous_players
             
             # Find players who left
             left_players = self.previous_players - current_players
             
-            # Process joins
-            for player_name in joined_players:
-                await self._handle_player_join(player_name, current_players_data)
+            changed_players = joined_players | left_players
             
-            # Process leaves
-            for player_name in left_players:
-                await self._handle_player_leave(player_name)
+            # Without a notification channel only the events are logged, skip building embeds
+            notify = bool(changed_players) and await self._get_channel() is not None
             
-            # Update tracking
-            self.previous_players = current_players.copy()
+            # Database records for everyone who joined or left, in one query, used by the embeds
+            db_players = await self.bot.db_manager.get_players_by_names(list(changed_players)) if notify else {}
+            
+            # Process joins and leaves concurrently, each handler logs its own failures
+            results = await asyncio.gather(
+                *(
+                    self._handle_player_join(name, players_by_name[name], db_players.get(name), now, notify)
+                    for name in joined_players
+                ),
+                *(self._handle_player_leave(name, db_players.get(name), now, notify) for name in left_players),
+                return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"Error handling player change: {result}")
+            
+            # Update tracking, current_players is built fresh each check
+            self.previous_players = current_players
             
             # Update join times for current players
-            current_time = datetime.now()
             for player_name in current_players:
                 if player_name not in self.player_join_times:
-                    self.player_join_times[player_name] = current_time
+                    self.player_join_times[player_name] = now
             
             # Remove join times for players who left
             for player_name in left_players:
@@ -50,19 +86,9 @@ class NotificationManager:
         except Exception as e:
             logger.error(f"Error checking player changes: {e}")
     
-    async def _handle_player_join(self, player_name: str, players_data: List[Dict[str, Any]]):
+    async def _handle_player_join(self, player_name: str, player_data: Dict[str, Any], db_player: Optional[Dict[str, Any]], now: float, notify: bool = True):
         """Handle player join event"""
         try:
-            # Find player data
-            player_data = None
-            for player in players_data:
-                if player.get('name') == player_name:
-                    player_data = player
-                    break
-            
-            if not player_data:
-                return
-            
             # Log event to database
             await self.bot.db_manager.log_event('join', player_name, {
                 'ping': player_data.get('ping', 0),
@@ -70,25 +96,22 @@ class NotificationManager:
             })
             
             # Send notification
-            embed = await self._create_join_embed(player_name, player_data)
-            await self._send_notification(embed)
+            if notify:
+                embed = await self._create_join_embed(player_name, player_data, db_player, now)
+                await self._send_notification(embed)
             
             logger.info(f"Player joined: {player_name}")
             
         except Exception as e:
             logger.error(f"Error handling player join for {player_name}: {e}")
     
-    async def _handle_player_leave(self, player_name: str):
+    async def _handle_player_leave(self, player_name: str, player_db_data: Optional[Dict[str, Any]], now: float, notify: bool = True):
         """Handle player leave event"""
         try:
             # Calculate session duration
             session_duration = 0
             if player_name in self.player_join_times:
-                join_time = self.player_join_times[player_name]
-                session_duration = (datetime.now() - join_time).total_seconds()
-            
-            # Get player data from database for additional info
-            player_db_data = await self.bot.db_manager.get_player(player_name)
+                session_duration = now - self.player_join_times[player_name]
             
             # Log event to database
             await self.bot.db_manager.log_event('leave', player_name, {
@@ -96,28 +119,26 @@ class NotificationManager:
             })
             
             # Send notification
-            embed = await self._create_leave_embed(player_name, session_duration, player_db_data)
-            await self._send_notification(embed)
+            if notify:
+                embed = await self._create_leave_embed(player_name, session_duration, now, player_db_data)
+                await self._send_notification(embed)
             
             logger.info(f"Player left: {player_name}")
             
         except Exception as e:
             logger.error(f"Error handling player leave for {player_name}: {e}")
     
-    async def _create_join_embed(self, player_name: str, player_data: Dict[str, Any]) -> discord.Embed:
+    async def _create_join_embed(self, player_name: str, player_data: Dict[str, Any], db_player: Optional[Dict[str, Any]], now: float) -> discord.Embed:
         """Create embed for player join notification"""
         try:
             embed = discord.Embed(
                 title="🟢 Player Joined",
-                color=discord.Color.green(),
-                timestamp=datetime.now()
+                color=_COLOR_GREEN,
+                timestamp=datetime.fromtimestamp(now, tz=timezone.utc)
             )
             
             ping = player_data.get('ping', 0)
             
-            # Get player info from database
-            db_player = await self.bot.db_manager.get_player(player_name)
-            
             embed.add_field(
                 name="👤 Player",
                 value=f"**{player_name}**",
@@ -132,7 +153,7 @@ class NotificationManager:
             
             embed.add_field(
                 name="🕐 Time",
-                value=f"<t:{int(datetime.now().timestamp())}:T>",
+                value=f"<t:{int(now)}:T>",
                 inline=True
             )
             
@@ -156,28 +177,27 @@ class NotificationManager:
                 # Add playtime if available
                 playtime = db_player.get('playtime', 0)
                 if playtime > 0:
-                    from utils.helpers import format_playtime
                     embed.add_field(
                         name="⏰ Total Playtime",
                         value=format_playtime(playtime),
                         inline=True
                     )
             
-            embed.set_footer(text="Motionlife Roleplay")
+            embed.set_footer(text=_FOOTER_TEXT)
             
             return embed
             
         except Exception as e:
             logger.error(f"Error creating join embed: {e}")
-            return create_embed_template("🟢 Player Joined", discord.Color.green())
+            return create_embed_template("🟢 Player Joined", _COLOR_GREEN)
     
-    async def _create_leave_embed(self, player_name: str, session_duration: float, player_db_data: Dict[str, Any] = None) -> discord.Embed:
+    async def _create_leave_embed(self, player_name: str, session_duration: float, now: float, player_db_data: Dict[str, Any] = None) -> discord.Embed:
         """Create embed for player leave notification"""
         try:
             embed = discord.Embed(
                 title="🔴 Player Left",
-                color=discord.Color.red(),
-                timestamp=datetime.now()
+                color=_COLOR_RED,
+                timestamp=datetime.fromtimestamp(now, tz=timezone.utc)
             )
             
             embed.add_field(
@@ -188,7 +208,6 @@ class NotificationManager:
             
             # Format session duration
             if session_duration > 0:
-                from utils.helpers import format_playtime
                 embed.add_field(
                     name="⏱️ Session Duration",
                     value=format_playtime(int(session_duration)),
@@ -197,7 +216,7 @@ class NotificationManager:
             
             embed.add_field(
                 name="🕐 Time",
-                value=f"<t:{int(datetime.now().timestamp())}:T>",
+                value=f"<t:{int(now)}:T>",
                 inline=True
             )
             
@@ -221,20 +240,31 @@ class NotificationManager:
                 # Add total playtime
                 playtime = player_db_data.get('playtime', 0)
                 if playtime > 0:
-                    from utils.helpers import format_playtime
                     embed.add_field(
                         name="⏰ Total Playtime",
                         value=format_playtime(playtime),
                         inline=True
                     )
             
-            embed.set_footer(text="Motionlife Roleplay")
+            embed.set_footer(text=_FOOTER_TEXT)
             
             return embed
             
         except Exception as e:
             logger.error(f"Error creating leave embed: {e}")
-            return create_embed_template("🔴 Player Left", discord.Color.red())
+            return create_embed_template("🔴 Player Left", _COLOR_RED)
+    
+    async def _get_channel(self):
+        """Get notifications channel, resolving and caching it on first use"""
+        if self._channel is None and self.bot.config.NOTIFICATIONS_CHANNEL_ID:
+            channel = self.bot.get_channel(self.bot.config.NOTIFICATIONS_CHANNEL_ID)
+            if channel is None:
+                try:
+                    channel = await self.bot.fetch_channel(self.bot.config.NOTIFICATIONS_CHANNEL_ID)
+                except discord.HTTPException as e:
+                    logger.warning(f"Could not fetch notification channel: {e}")
+            self._channel = channel
+        return self._channel
     
     async def _send_notification(self, embed: discord.Embed):
         """Send notification to designated channel"""
@@ -242,7 +272,7 @@ class NotificationManager:
             if not self.bot.config.NOTIFICATIONS_CHANNEL_ID:
                 return
             
-            channel = self.bot.get_channel(self.bot.config.NOTIFICATIONS_CHANNEL_ID)
+            channel = await self._get_channel()
             if channel:
                 await channel.send(embed=embed)
             else:
@@ -257,7 +287,7 @@ class NotificationManager:
             if not self.bot.config.NOTIFICATIONS_CHANNEL_ID:
                 return
             
-            channel = self.bot.get_channel(self.bot.config.NOTIFICATIONS_CHANNEL_ID)
+            channel = await self._get_channel()
             if not channel:
                 return
             
@@ -265,8 +295,8 @@ class NotificationManager:
                 embed = discord.Embed(
                     title="🟢 Server Online",
                     description="The server is now online and accepting connections.",
-                    color=discord.Color.green(),
-                    timestamp=datetime.now()
+                    color=_COLOR_GREEN,
+                    timestamp=datetime.now(timezone.utc)
                 )
                 
                 if details:
@@ -286,16 +316,16 @@ class NotificationManager:
                 embed = discord.Embed(
                     title="🔴 Server Offline",
                     description="The server is currently offline or unreachable.",
-                    color=discord.Color.red(),
-                    timestamp=datetime.now()
+                    color=_COLOR_RED,
+                    timestamp=datetime.now(timezone.utc)
                 )
                 
             elif status == "maintenance":
                 embed = discord.Embed(
                     title="⚙️ Server Maintenance",
                     description="The server is in maintenance mode with low player count.",
-                    color=discord.Color.orange(),
-                    timestamp=datetime.now()
+                    color=_COLOR_ORANGE,
+                    timestamp=datetime.now(timezone.utc)
                 )
                 
                 if details:
@@ -308,7 +338,7 @@ class NotificationManager:
             else:
                 return  # Unknown status
             
-            embed.set_footer(text="Motionlife Roleplay")
+            embed.set_footer(text=_FOOTER_TEXT)
             await channel.send(embed=embed)
             
         except Exception as e:
@@ -320,14 +350,14 @@ class NotificationManager:
             if not self.bot.config.NOTIFICATIONS_CHANNEL_ID:
                 return
             
-            channel = self.bot.get_channel(self.bot.config.NOTIFICATIONS_CHANNEL_ID)
+            channel = await self._get_channel()
             if not channel:
                 return
             
             embed = discord.Embed(
                 title="🎉 Milestone Achievement!",
-                color=discord.Color.gold(),
-                timestamp=datetime.now()
+                color=_COLOR_GOLD,
+                timestamp=datetime.now(timezone.utc)
             )
             
             if milestone_type == "playtime_hours":
@@ -346,7 +376,7 @@ class NotificationManager:
                     inline=True
                 )
             
-            embed.set_footer(text="Motionlife Roleplay")
+            embed.set_footer(text=_FOOTER_TEXT)
             await channel.send(embed=embed)
             
         except Exception as e:
@@ -357,57 +387,37 @@ class NotificationManager:
         try:
             embed = discord.Embed(
                 title=f"📊 Player Activity Summary ({period_hours}h)",
-                color=discord.Color.blue(),
-                timestamp=datetime.now()
+                color=_COLOR_BLUE,
+                timestamp=datetime.now(timezone.utc)
             )
             
-            # Get recent events
-            recent_events = await self.bot.db_manager.get_recent_events(limit=100)
-            
-            # Filter events by time period
+            # Stored event timestamps are naive local time, so the cutoff must be too
             cutoff_time = datetime.now() - timedelta(hours=period_hours)
-            period_events = [
-                event for event in recent_events 
-                if event.get('timestamp', datetime.min) >= cutoff_time
-            ]
-            
-            # Count joins and leaves
-            joins = [e for e in period_events if e.get('event_type') == 'join']
-            leaves = [e for e in period_events if e.get('event_type') == 'leave']
             
-            # Get unique players
-            unique_players = set()
-            for event in period_events:
-                unique_players.add(event.get('player_name'))
+            # Counts for the period, aggregated by the database
+            summary = await self.bot.db_manager.get_event_activity_summary(cutoff_time, top_limit=5)
             
             embed.add_field(
                 name="👥 Unique Players",
-                value=str(len(unique_players)),
+                value=str(summary['unique_players']),
                 inline=True
             )
             
             embed.add_field(
                 name="🟢 Total Joins",
-                value=str(len(joins)),
+                value=str(summary['joins']),
                 inline=True
             )
             
             embed.add_field(
                 name="🔴 Total Leaves",
-                value=str(len(leaves)),
+                value=str(summary['leaves']),
                 inline=True
             )
             
             # Most active players
-            player_activity = {}
-            for event in period_events:
-                player_name = event.get('player_name')
-                if player_name:
-                    player_activity[player_name] = player_activity.get(player_name, 0) + 1
-            
-            if player_activity:
-                top_active = sorted(player_activity.items(), key=lambda x: x[1], reverse=True)[:5]
-                active_text = "\n".join([f"• **{name}**: {count} events" for name, count in top_active])
+            if summary['most_active']:
+                active_text = "\n".join([f"• **{name}**: {count} events" for name, count in summary['most_active']])
                 
                 embed.add_field(
                     name="🔥 Most Active Players",
@@ -415,12 +425,12 @@ class NotificationManager:
                     inline=False
                 )
             
-            embed.set_footer(text="Motionlife Roleplay")
+            embed.set_footer(text=_FOOTER_TEXT)
             return embed
             
         except Exception as e:
             logger.error(f"Error creating player summary embed: {e}")
-            return create_embed_template("📊 Player Activity Summary", discord.Color.blue())
+            return create_embed_template("📊 Player Activity Summary", _COLOR_BLUE)
     
     async def send_daily_summary(self):
         """Send daily player activity summary"""
@@ -439,14 +449,14 @@ class NotificationManager:
         """Check if a specific player is currently online"""
         return player_name in self.previous_players
     
-    async def send_custom_notification(self, title: str, description: str, color: discord.Color = discord.Color.blue(), fields: List[Dict[str, Any]] = None):
+    async def send_custom_notification(self, title: str, description: str, color: discord.Color = _COLOR_BLUE, fields: List[Dict[str, Any]] = None):
         """Send custom notification"""
         try:
             embed = discord.Embed(
                 title=title,
                 description=description,
                 color=color,
-                timestamp=datetime.now()
+                timestamp=datetime.now(timezone.utc)
             )
             
             if fields:
@@ -457,7 +467,7 @@ class NotificationManager:
                         inline=field.get('inline', True)
                     )
             
-            embed.set_footer(text="Motionlife Roleplay")
+            embed.set_footer(text=_FOOTER_TEXT)
             await self._send_notification(embed)
             
         except Exception as e:
@@ -1,4 +1,5 @@
 from .config import Config
+from .async_cache import async_ttl_cache, invalidate_cache
 from .helpers import (
     format_playtime,
     format_ping,
@@ -20,6 +21,8 @@ from .helpers import (
 
 __all__ = [
     'Config',
+    'async_ttl_cache',
+    'invalidate_cache',
     'format_playtime',
     'format_ping',
     'get_ping_color',
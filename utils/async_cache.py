@@ -0,0 +1,60 @@
+import asyncio
+import functools
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+CACHE_VERSION_ATTR = '_cache_version'
+
+def async_ttl_cache(ttl: float = 60, maxsize: Optional[int] = None) -> Callable:
+    """Cache results of an async method for ``ttl`` seconds.
+
+    Concurrent callers with the same arguments share one in-flight call.
+    Bumping ``self._cache_version`` invalidates all cached results for that
+    instance. With ``maxsize`` set, the oldest entries are evicted first.
+    """
+    def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        cache: Dict[Hashable, Tuple[float, asyncio.Future]] = {}
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            key = (
+                id(self),
+                getattr(self, CACHE_VERSION_ATTR, 0),
+                args,
+                tuple(sorted(kwargs.items()))
+            )
+            now = time.monotonic()
+
+            entry = cache.get(key)
+            if entry is None or entry[0] <= now:
+                # Drop expired entries so stale versions don't accumulate
+                for stale_key in [k for k, (expiry, _) in cache.items() if expiry <= now]:
+                    del cache[stale_key]
+
+                if maxsize is not None:
+                    while len(cache) >= maxsize:
+                        del cache[next(iter(cache))]
+
+                future = asyncio.ensure_future(func(self, *args, **kwargs))
+                cache[key] = (now + ttl, future)
+
+                def _discard_on_error(done: asyncio.Future, key=key):
+                    if done.cancelled() or done.exception() is not None:
+                        if cache.get(key, (None, None))[1] is done:
+                            del cache[key]
+
+                future.add_done_callback(_discard_on_error)
+            else:
+                future = entry[1]
+
+            # Shield so one cancelled caller doesn't cancel the shared call
+            return await asyncio.shield(future)
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+
+    return decorator
+
+def invalidate_cache(instance: Any):
+    """Invalidate all async_ttl_cache results for an instance"""
+    setattr(instance, CACHE_VERSION_ATTR, getattr(instance, CACHE_VERSION_ATTR, 0) + 1)
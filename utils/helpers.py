@@ -1,8 +1,42 @@
 import discord
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from types import MappingProxyType
 from typing import List, Dict, Any, Optional
 import re
 
+# Characters stripped from stored names, and the allowed player name format
+_SANITIZE_RE = re.compile(r'[^\w\s-]')
+_VALID_NAME_RE = re.compile(r'^[a-zA-Z0-9\s_-]+$')
+
+_ROLE_EMOJIS = MappingProxyType({
+    'admin': '👑',
+    'moderator': '🛡️',
+    'vip': '⭐',
+    'police': '👮',
+    'ems': '🚑',
+    'mechanic': '🔧',
+    'civilian': '👤',
+    'default': '👤'
+})
+
+_JOB_EMOJIS = MappingProxyType({
+    'police': '👮‍♂️',
+    'sheriff': '🤠',
+    'ems': '🚑',
+    'fire': '🚒',
+    'mechanic': '🔧',
+    'taxi': '🚕',
+    'trucker': '🚛',
+    'lawyer': '⚖️',
+    'judge': '👨‍⚖️',
+    'doctor': '👨‍⚕️',
+    'unemployed': '❌',
+    'civilian': '👤'
+})
+_DEFAULT_JOB_EMOJI = '💼'
+
+@lru_cache(maxsize=4096)
 def format_playtime(seconds: int) -> str:
     """Format playtime seconds to readable string"""
     if seconds < 60:
@@ -19,6 +53,7 @@ def format_playtime(seconds: int) -> str:
         hours = (seconds % 86400) // 3600
         return f"{days}d {hours}h"
 
+@lru_cache(maxsize=4096)
 def format_ping(ping: float) -> str:
     """Format ping value with color indication"""
     if ping < 50:
@@ -40,7 +75,7 @@ def get_ping_color(ping: float) -> discord.Color:
 def sanitize_player_name(name: str) -> str:
     """Sanitize player name for database storage"""
     # Remove special characters and limit length
-    sanitized = re.sub(r'[^\w\s-]', '', name)
+    sanitized = _SANITIZE_RE.sub('', name)
     return sanitized[:50].strip()
 
 def calculate_percentage(value: float, total: float) -> float:
@@ -89,46 +124,24 @@ def is_valid_player_name(name: str) -> bool:
         return False
     
     # Check for valid characters (letters, numbers, spaces, hyphens, underscores)
-    return bool(re.match(r'^[a-zA-Z0-9\s_-]+$', name))
+    return bool(_VALID_NAME_RE.match(name))
 
 def get_role_emoji(role: str) -> str:
     """Get emoji for player role"""
-    role_emojis = {
-        'admin': '👑',
-        'moderator': '🛡️',
-        'vip': '⭐',
-        'police': '👮',
-        'ems': '🚑',
-        'mechanic': '🔧',
-        'civilian': '👤',
-        'default': '👤'
-    }
-    return role_emojis.get(role.lower(), role_emojis['default'])
+    # Stored roles are already lowercase, so only lowercase on a miss
+    return _ROLE_EMOJIS.get(role) or _ROLE_EMOJIS.get(role.lower(), _ROLE_EMOJIS['default'])
 
 def get_job_emoji(job: str) -> str:
     """Get emoji for player job"""
-    job_emojis = {
-        'police': '👮‍♂️',
-        'sheriff': '🤠',
-        'ems': '🚑',
-        'fire': '🚒',
-        'mechanic': '🔧',
-        'taxi': '🚕',
-        'trucker': '🚛',
-        'lawyer': '⚖️',
-        'judge': '👨‍⚖️',
-        'doctor': '👨‍⚕️',
-        'unemployed': '❌',
-        'civilian': '👤'
-    }
-    return job_emojis.get(job.lower(), '💼')
-
-def create_embed_template(title: str, color: discord.Color = discord.Color.blue()) -> discord.Embed:
+    return _JOB_EMOJIS.get(job) or _JOB_EMOJIS.get(job.lower(), _DEFAULT_JOB_EMOJI)
+
+def create_embed_template(title: str, color: discord.Color = discord.Color.blue(), description: Optional[str] = None) -> discord.Embed:
     """Create a standard embed template"""
     embed = discord.Embed(
         title=title,
         color=color,
-        timestamp=datetime.now()
+        description=description,
+        timestamp=datetime.now(timezone.utc)
     )
     embed.set_footer(text="Motionlife Roleplay", icon_url="https://i.imgur.com/your-server-icon.png")
     return embed